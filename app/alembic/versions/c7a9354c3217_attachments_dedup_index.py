@@ -0,0 +1,32 @@
+"""attachments dedup index
+
+Revision ID: c7a9354c3217
+Revises: 8567b8630287
+Create Date: 2026-10-14 15:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a9354c3217'
+down_revision = '8567b8630287'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # PostgreSQL 下并发建索引不锁表，需在事务外执行
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_attach_dedup',
+            'attachments',
+            ['uploader_id', 'checksum', 'type', 'mime_type'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_attach_dedup', table_name='attachments', postgresql_concurrently=True)
@@ -0,0 +1,33 @@
+"""tenant auth token lookup index
+
+Revision ID: d41b6e02a8f5
+Revises: c7a9354c3217
+Create Date: 2026-10-14 17:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b6e02a8f5'
+down_revision = 'c7a9354c3217'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # PostgreSQL 下并发建索引不锁表，需在事务外执行
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_tenant_auth_token_lookup',
+            'tenant_auth_token',
+            ['tenant_id', 'appid', sa.text('expire_time DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tenant_auth_token_lookup', table_name='tenant_auth_token', postgresql_concurrently=True)
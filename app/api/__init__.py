@@ -1,8 +1,29 @@
 # API package for OpenCode MVP framework
+import functools
+import importlib
+
 from fastapi import APIRouter
-from .config import router as config_router
-from .health import router as health_router
-router = APIRouter()
+from .routing import flat_include
+
+# 子路由注册表：(子模块名, 路由前缀)，子模块在 build_router() 时才导入
+SUB_ROUTERS = (
+    ("config", "/config"),
+    ("health", "/health"),
+)
+
+
+@functools.cache
+def build_router() -> APIRouter:
+    """导入全部子路由并平铺为一个 APIRouter，进程内只构建一次"""
+    router = APIRouter()
+    for name, prefix in SUB_ROUTERS:
+        module = importlib.import_module(f"{__name__}.{name}")
+        flat_include(router, module.router, prefix=prefix)
+    return router
+
 
-router.include_router(config_router, prefix="/config")
-router.include_router(health_router, prefix="/health")
+def __getattr__(name):
+    # 兼容旧的 `from app.api import router` 写法
+    if name == "router":
+        return build_router()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
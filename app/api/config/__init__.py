@@ -1,5 +1,6 @@
 from fastapi import APIRouter
+from app.api.routing import flat_include
 from .config import router as config_router
 router = APIRouter()
 
-router.include_router(config_router, tags=["config"])
\ No newline at end of file
+flat_include(router, config_router, tags=["config"])
@@ -1,19 +1,28 @@
+import orjson
 from fastapi import APIRouter
-from starlette.responses import JSONResponse
+from starlette.responses import Response
 
+from app.api.response import ResponseCode
 from app.core.base_endpoint import BaseHTTPEndpoint
 
 router = APIRouter()
 
+# 配置在进程内不会变化，导入时序列化一次
+_CONFIG_BYTES = orjson.dumps({
+    "code": ResponseCode.normal.value,
+    "message": "ok",
+    "response": {
+        "config": {
+            "databases": ["postgres_main"],
+            "redis": {"url": "redis://localhost:6379/0"},
+            "celery": {"broker": "amqp://guest@localhost//", "backend": "redis://localhost:6379/0"}
+        }
+    },
+})
+
 
 class ConfigEndpoint(BaseHTTPEndpoint):
     async def get(self, request):
-        return self.success_response({
-            "config": {
-                "databases": ["postgres_main"],
-                "redis": {"url": "redis://localhost:6379/0"},
-                "celery": {"broker": "amqp://guest@localhost//", "backend": "redis://localhost:6379/0"}
-            }
-        })
+        return Response(_CONFIG_BYTES, media_type="application/json")
 
 router.add_route("/get", ConfigEndpoint, methods=["GET"])
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
+from app.api.routing import flat_include
 from .health import router as health_router
 
 router = APIRouter()
 
-router.include_router(health_router, tags=["health"])
\ No newline at end of file
+flat_include(router, health_router, tags=["health"])
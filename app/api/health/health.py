@@ -1,13 +1,18 @@
+import orjson
 from fastapi import APIRouter
-from starlette.responses import JSONResponse
+from starlette.responses import Response
 
+from app.api.response import ResponseCode
 from app.core.base_endpoint import BaseHTTPEndpoint
 router = APIRouter()
 
+# 响应内容固定，导入时序列化一次
+_HEALTH_BYTES = orjson.dumps({"code": ResponseCode.normal.value, "message": "ok", "response": {"status": "ok"}})
+
+
 class HealthEndpoint(BaseHTTPEndpoint):
     async def get(self, request):
         # MVP: simple health check
-        return self.success_response({"status": "ok"})
+        return Response(_HEALTH_BYTES, media_type="application/json")
 
 router.add_route("/get", HealthEndpoint, methods=["GET"])
-
@@ -0,0 +1,59 @@
+import copy
+from typing import List, Optional
+
+from fastapi import APIRouter
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from fastapi.utils import get_value_or_default
+from starlette.routing import Mount, compile_path, request_response
+
+
+def flat_include(parent: APIRouter, child: APIRouter, prefix: str = "", tags: Optional[List[str]] = None) -> None:
+    """将子路由直接平铺到父路由中
+
+    FastAPI 的 include_router 会对每个路由重新执行 APIRoute 的初始化逻辑（依赖解析、响应模型构建等），
+    路由树嵌套越深启动越慢。这里对每个路由只做一次浅拷贝并重新编译带前缀的路径，直接追加到 parent.routes。
+    APIRoute 与 include_router 一样按 子路由 -> 父路由 的顺序解析默认响应类，并按新路径重新生成 unique_id。
+
+    Args:
+        parent: 目标路由
+        child: 被合并的子路由
+        prefix: 路径前缀，例如 "/health"
+        tags: 追加到 APIRoute 上的标签
+    """
+    for route in child.routes:
+        new_route = copy.copy(route)
+        new_route.path = prefix + route.path
+        if isinstance(new_route, Mount):
+            # Mount 需要匹配子路径，与 starlette 的编译规则保持一致
+            new_route.path_regex, new_route.path_format, new_route.param_convertors = compile_path(
+                new_route.path + "/{path:path}"
+            )
+        else:
+            new_route.path_regex, new_route.path_format, new_route.param_convertors = compile_path(new_route.path)
+        if isinstance(new_route, APIRoute):
+            _resolve_api_route(new_route, child, parent)
+            if tags:
+                new_route.tags = [*tags, *new_route.tags]
+        parent.routes.append(new_route)
+
+
+def _resolve_api_route(route: APIRoute, child: APIRouter, parent: APIRouter) -> None:
+    """补齐 include_router 会做的默认值解析：响应类与 unique_id"""
+    response_class = get_value_or_default(
+        route.response_class, child.default_response_class, parent.default_response_class
+    )
+    if response_class is not route.response_class:
+        # 响应类在创建处理函数时就已确定，变更后需要重建 ASGI app
+        route.response_class = response_class
+        route.app = request_response(route.get_route_handler())
+
+    generate_unique_id_function = get_value_or_default(
+        route.generate_unique_id_function,
+        child.generate_unique_id_function,
+        parent.generate_unique_id_function,
+    )
+    if isinstance(generate_unique_id_function, DefaultPlaceholder):
+        generate_unique_id_function = generate_unique_id_function.value
+    route.generate_unique_id_function = generate_unique_id_function
+    route.unique_id = route.operation_id or generate_unique_id_function(route)
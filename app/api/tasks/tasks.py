@@ -1,11 +1,14 @@
+import orjson
 from fastapi import APIRouter
 from starlette.responses import JSONResponse
 
+from app.core import get_redis
 from app.core.base_endpoint import BaseHTTPEndpoint
 
 router = APIRouter()
 
-TASK_REGISTRY = {}
+# 任务注册表存放在 Redis 哈希中，多 worker 共享
+TASK_REGISTRY_KEY = "tasks:registry"
 
 
 class TaskRegisterEndpoint(BaseHTTPEndpoint):
@@ -14,26 +17,28 @@ class TaskRegisterEndpoint(BaseHTTPEndpoint):
         name = data.get("name") if isinstance(data, dict) else None
         if not name:
             return self.error_response()
-        TASK_REGISTRY[name] = {"name": name}
-        return self.success_response({"registered": name})
+        redis = await get_redis()
+        await redis.hset(TASK_REGISTRY_KEY, name, orjson.dumps({"name": name}))
+        return self.success_response_raw({"registered": name})
 
 class TaskRunEndpoint(BaseHTTPEndpoint):
     async def post(self, request):
         data = await request.json()
         # placeholder behavior
-        return self.success_response({"task_id": "mock-task-id"})
+        return self.success_response_raw({"task_id": "mock-task-id"})
 
 class TaskStatusEndpoint(BaseHTTPEndpoint):
     async def get(self, request):
-        # path param not easily captured here; provide generic response
-        return self.success_response({"task_id": request.path_params.get("task_id"), "status": "PENDING"})
+        return self.success_response_raw({"task_id": request.path_params.get("task_id"), "status": "PENDING"})
 
 class TasksRegisteredEndpoint(BaseHTTPEndpoint):
     async def get(self, request):
-        return self.success_response(list(TASK_REGISTRY.keys()))
+        redis = await get_redis()
+        names = await redis.hkeys(TASK_REGISTRY_KEY)
+        return self.success_response_raw(list(names or []))
 
 
 router.add_route("/register", TaskRegisterEndpoint, methods=["POST"])
 router.add_route("/run", TaskRunEndpoint, methods=["POST"])
-router.add_route("/status", TaskStatusEndpoint, methods=["GET"])
+router.add_route("/status/{task_id}", TaskStatusEndpoint, methods=["GET"])
 router.add_route("/registered", TasksRegisteredEndpoint, methods=["GET"])
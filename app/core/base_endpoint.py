@@ -1,18 +1,16 @@
-import json
-from contextlib import asynccontextmanager
-from decimal import Decimal
 from typing import Any, Dict, Optional
 
+import orjson
 from fastapi import status
-from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.endpoints import HTTPEndpoint
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
 
 from app.api.response import ResponseCode, error_massage, success_response
 from app.core import get_redis
-from app.core.database import get_db, get_db_session
+from app.core.database import get_db_session
+from app.core.responses import ORJSON_OPTIONS, ORJSONResponse
 from app.utils import ModelClient
 import logging
 
@@ -22,32 +20,19 @@ _logger = logging.getLogger(__name__)
 class BaseHTTPEndpoint(HTTPEndpoint):
     """基础HTTP端点类，提供数据库会话管理"""
 
-    @asynccontextmanager
-    async def get_db_session(self, db_type: str = "default"):
+    def get_db_session(self, db_type: str = "default"):
         """获取数据库会话的上下文管理器
 
         Args:
             db_type: 数据库类型，可选值: "default", "news", "market", "ai_interpretation"
 
-        这个方法只在需要时创建数据库会话，避免资源浪费
+        这个方法只在需要时创建数据库会话，避免资源浪费；提交与回滚由 DatabaseManager.session 统一处理
         使用方式：
         async with self.get_db_session("ai_interpretation") as db:
             # 使用数据库会话
             pass
         """
-        if db_type == "default":
-            # 兼容原有代码，使用依赖注入方式的默认数据库
-            async for session in get_db():
-                try:
-                    yield session
-                except Exception as ex:
-                    _logger.error("Error in db session:%s"%str(ex), exc_info=True)
-                    # get_db() 已经处理了回滚，这里不需要重复处理
-                    raise
-        else:
-            # 使用新的多数据库支持
-            async with get_db_session(db_type) as session:
-                yield session
+        return get_db_session(db_type)
 
     async def parse_json_body(self, request: Request) -> Dict[str, Any]:
         """解析JSON请求体"""
@@ -55,8 +40,8 @@ class BaseHTTPEndpoint(HTTPEndpoint):
             body = await request.body()
             if not body:
                 return {}
-            return json.loads(body)
-        except json.JSONDecodeError:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
             raise ValueError("Invalid JSON format")
 
     def error_response(
@@ -69,25 +54,38 @@ class BaseHTTPEndpoint(HTTPEndpoint):
             message: 自定义错误消息，如果为None则使用默认消息
 
         Returns:
-            JSONResponse: 格式化的错误响应，始终返回HTTP 200状态码
+            JSONResponse: 格式化的错误响应，始终返回HTTP 200状态码；业务码同时记录在 custom_code 属性上
         """
         error_msg = message if message else error_massage.get(code.value, "")
-        return JSONResponse(
+        response = JSONResponse(
             content={"code": code.value, "message": error_msg}, status_code=200
         )
+        response.custom_code = code.value
+        return response
 
     def success_response(
         self, data: Any, status_code: int = status.HTTP_200_OK
     ) -> JSONResponse:
         """创建成功响应"""
-
-        custom_encoder = {Decimal: lambda d: str(d)}
-        encoded_data = jsonable_encoder(
-            {"code": ResponseCode.normal.value, "message": "ok", "response": data},
-            custom_encoder=custom_encoder,
+        response = ORJSONResponse(
+            content={"code": ResponseCode.normal.value, "message": "ok", "response": data},
+            status_code=status_code,
         )
-        return JSONResponse(content=encoded_data, status_code=status_code)
-
-
+        response.custom_code = ResponseCode.normal.value
+        return response
 
+    def success_response_raw(
+        self, data: Any, status_code: int = status.HTTP_200_OK
+    ) -> Response:
+        """创建成功响应（快速路径）
 
+        data 只能包含 JSON 原生类型（dict/list/str/int/float/bool/None），
+        不经过任何 default 回调，直接序列化为字节
+        """
+        body = orjson.dumps(
+            {"code": ResponseCode.normal.value, "message": "ok", "response": data},
+            option=ORJSON_OPTIONS,
+        )
+        response = Response(content=body, status_code=status_code, media_type="application/json")
+        response.custom_code = ResponseCode.normal.value
+        return response
@@ -1,3 +1,4 @@
+import functools
 from typing import Optional, Callable, Any
 from celery import Celery
 from urllib.parse import quote_plus
@@ -18,24 +19,25 @@ def _build_broker_url() -> str:
     return f"amqp://{user_enc}:{pass_enc}@{host}:{port}{vh}"
 
 
-class _CeleryApp:
-    _app: Optional[Celery] = None
+@functools.cache
+def _celery_app() -> Celery:
+    """进程内唯一的 Celery 应用，测试中可通过 _celery_app.cache_clear() 重建
 
-    @classmethod
-    def get_app(cls) -> Celery:
-        if cls._app is None:
-            broker_url = _build_broker_url()
-            cls._app = Celery("app_tasks", broker=broker_url, backend="rpc://")
-            cls._app.conf.update(
-                task_serializer="json",
-                accept_content=["json"],
-                result_serializer="json",
-                timezone="Asia/Shanghai",
-                enable_utc=False,
-                task_default_queue="default",
-                task_track_started=True,
-            )
-        return cls._app
+    broker URL 在首次创建时计算，而不是在导入时固定为模块常量，便于测试替换 _build_broker_url
+    """
+    app = Celery("app_tasks", broker=_build_broker_url(), backend="rpc://")
+    app.conf.update(
+        # msgpack 编解码更快、消息体更小；保留 json 以便消费升级前已入队的消息
+        task_serializer="msgpack",
+        accept_content=["msgpack", "json"],
+        result_serializer="msgpack",
+        result_accept_content=["msgpack", "json"],
+        timezone="Asia/Shanghai",
+        enable_utc=False,
+        task_default_queue="default",
+        task_track_started=True,
+    )
+    return app
 
 
 def celery_task(queue: Optional[str] = None, **task_kwargs):
@@ -49,11 +51,11 @@ def celery_task(queue: Optional[str] = None, **task_kwargs):
         ...
     """
     def _decorator(func: Callable[..., Any]):
-        app = _CeleryApp.get_app()
+        app = _celery_app()
         if queue:
             task_kwargs["queue"] = queue
         return app.task(func, **task_kwargs)
     return _decorator
 
 # 兼容 Celery CLI 使用方式，暴露一个 module-level app
-celery = _CeleryApp.get_app()
+celery = _celery_app()
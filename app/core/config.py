@@ -3,6 +3,9 @@ from pathlib import Path
 from pydantic import BaseModel, field_validator
 from typing import Dict, Any, Optional, List
 
+# 优先使用 LibYAML 的 C 实现，未编译 LibYAML 时回退到纯 Python 的 SafeLoader
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 
 class DatabaseConfig(BaseModel):
@@ -14,11 +17,21 @@ class DatabaseConfig(BaseModel):
     port: int
     user: str
     password: str
-    pool_recycle: int = 300,
-    pool_size: int = 20,  # 基础连接池
-    max_overflow: int = 40,  # 溢出连接
-    pool_timeout: int = 30,  # 获取连接超时时间
+    # 连接池参数：每个 worker 进程各自持有一个连接池，
+    # 数据库端总连接数约为 worker数 * (pool_size + max_overflow)，按部署规模调整
+    pool_recycle: int = 1800  # 连接回收时间（秒）
+    pool_size: int = 25  # 基础连接池
+    max_overflow: int = 25  # 溢出连接
+    pool_timeout: int = 30  # 获取连接超时时间
+    # 取连接前是否先 SELECT 1 探活；默认关闭，依靠 pool_recycle 提前回收空闲连接。
+    # 经过 NAT/负载均衡、空闲连接可能被中间设备静默断开的长连接部署建议开启
+    pool_pre_ping: bool = False
+    prewarm: bool = True  # 启动时预先建立 pool_size 个连接
+    # 使用 NullPool：不保留空闲连接，每次会话都重新建连（多一次握手开销）。
+    # 适用于一次性脚本或 Serverless 等进程频繁回收的部署，开启后忽略上面的连接池参数与预热
+    use_null_pool: bool = False
     expire_on_commit: bool = False
+    autoflush: bool = False  # 关闭后查询前不再隐式 flush，需要时显式调用 session.flush()
 
     @property
     def url(self) -> str:
@@ -59,6 +72,13 @@ class CeleryConfig(BaseModel):
     backend_url: Optional[str] = None  # 使用 Redis 作为结果后端示例
     backend: Optional[str] = None      # 兼容老的后端配置，例如 'rpc://' 或 Redis URL
 
+class LoggerConfig(BaseModel):
+    """日志配置"""
+
+    verbose: bool = True  # 为 False 时跳过 log_process 流程日志
+    use_internal_rotation: bool = True  # 为 False 时交给 logrotate 轮转，进程收到 SIGHUP 后重新打开文件
+    buffer_records: int = 512  # 文件日志内存缓冲条数，遇到 ERROR 或缓冲满时批量写入
+
 class EmailConfig(BaseModel):
     """邮件配置"""
 
@@ -97,11 +117,23 @@ class WechatServiceAccountConfig(BaseModel):
 
 
 
+# 租户签名算法，与 app.utils._TENANT_SIGNATURES 保持一致
+TENANT_SIGNATURE_METHODS = ("md5", "hmac-sha256", "blake2b")
+
+
 class TenantConfig(BaseModel):
     """租户配置"""
     token_secret: str
     access_token_expire_time: int
     refresh_token_expire_time: int
+    signature_method: str = "md5"  # 签名算法：md5（旧版）/ hmac-sha256 / blake2b
+
+    @field_validator("signature_method")
+    @classmethod
+    def _check_signature_method(cls, value: str) -> str:
+        if value not in TENANT_SIGNATURE_METHODS:
+            raise ValueError(f"不支持的租户签名算法: {value}，可选 {', '.join(TENANT_SIGNATURE_METHODS)}")
+        return value
 
 class AliyunConfig(BaseModel):
     """阿里云配置"""
@@ -126,6 +158,7 @@ class Settings(BaseModel):
     attachment: AttachmentConfig
     wechat_service_account: Optional[WechatServiceAccountConfig]
     timescaledb: DatabaseConfig
+    external_db: Optional[DatabaseConfig] = None  # ExternalBase 模型所在的外部库
     tenant: TenantConfig
     aliyun: AliyunConfig
 
@@ -144,6 +177,9 @@ class Settings(BaseModel):
     # Celery 配置（可选）
     celery: Optional[CeleryConfig] = None
 
+    # 日志配置（可选，缺省使用默认值）
+    logger: LoggerConfig = LoggerConfig()
+
     @classmethod
     def from_yaml(cls, yaml_path: str = "config.yaml") -> "Settings":
         """从YAML文件加载配置"""
@@ -152,7 +188,7 @@ class Settings(BaseModel):
             raise FileNotFoundError(f"配置文件 {yaml_path} 不存在")
 
         with open(config_file, "r", encoding="utf-8") as f:
-            config_data = yaml.safe_load(f)
+            config_data = yaml.load(f, Loader=_YAML_LOADER)
 
         # 解析嵌套配置
         parsed_config = {}
@@ -189,6 +225,9 @@ class Settings(BaseModel):
         if "timescaledb" in config_data:
             parsed_config["timescaledb"] = DatabaseConfig(**config_data["timescaledb"])
 
+        if "external_db" in config_data:
+            parsed_config["external_db"] = DatabaseConfig(**config_data["external_db"])
+
         if "tenant" in config_data:
             parsed_config["tenant"] = TenantConfig(
                 **config_data["tenant"]
@@ -213,6 +252,9 @@ class Settings(BaseModel):
         if "celery" in config_data:
             parsed_config["celery"] = CeleryConfig(**config_data["celery"])
 
+        if "logger" in config_data:
+            parsed_config["logger"] = LoggerConfig(**config_data["logger"])
+
 
         return cls(**parsed_config)
 
@@ -1,15 +1,20 @@
+import base64
 import hashlib
-from datetime import datetime, timedelta
-from functools import wraps
-from typing import Any, Callable
-import json
+import time
+import uuid
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from functools import cache, wraps
+from typing import Any, Callable, Optional
+import orjson
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy import select
+import jwt
+from jwt import InvalidTokenError
+from sqlalchemy import Date, DateTime, Enum, Interval, LargeBinary, Numeric, Time, Uuid, select
+from sqlalchemy import inspect as sa_inspect
 import logging
 from fastapi.responses import StreamingResponse
-from starlette.responses import JSONResponse
 
 from app.core.database import get_db_session
 from app.core.redis import get_redis_sync
@@ -22,21 +27,106 @@ SECRET_KEY = "your-secret-key-here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 10080
 MAX_DEVICES_PER_USER = 2
+TOKEN_CACHE_PREFIX = "jwt"
+USER_CACHE_PREFIX = "user"
+USER_CACHE_EXPIRE = 60
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
 
+async def _decode_token(token: str) -> dict:
+    """解码JWT令牌，解码结果按令牌剩余有效期缓存在Redis中
+
+    :raises InvalidTokenError: 令牌无效或已过期
+    """
+    redis = get_redis_sync()
+    cache_key = f"{TOKEN_CACHE_PREFIX}:{hashlib.sha256(token.encode()).hexdigest()}"
+    cached = await redis.get(cache_key)
+    if cached:
+        return orjson.loads(cached)
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = payload.get("exp")
+    if exp:
+        ttl = int(exp - time.time())
+        if ttl > 0:
+            await redis.set(cache_key, orjson.dumps(payload).decode(), expire=ttl)
+    return payload
+
+
 def generate_device_fingerprint(request: Request) -> str:
-    """生成唯一设备指纹"""
+    """生成唯一设备指纹（仅用于相等比较，不作为签名使用）"""
     user_agent = request.headers.get("User-Agent", "")
     ip = request.client.host or "0.0.0.0"
-    return hashlib.sha256(f"{user_agent}:{ip}".encode()).hexdigest()
+    return hashlib.blake2b(f"{user_agent}:{ip}".encode(), digest_size=16).hexdigest()
+
+
+def _column_codec(col_type):
+    """按列类型返回 (序列化, 还原) 方法，JSON 原生类型为 (None, None)；无法还原时抛出 NotImplementedError"""
+    if isinstance(col_type, DateTime):
+        return None, datetime.fromisoformat
+    if isinstance(col_type, Date):
+        return None, date.fromisoformat
+    if isinstance(col_type, Time):
+        return None, dt_time.fromisoformat
+    if isinstance(col_type, Interval):
+        return timedelta.total_seconds, lambda v: timedelta(seconds=v)
+    if isinstance(col_type, Numeric):
+        return (str, Decimal) if col_type.asdecimal else (None, None)
+    if isinstance(col_type, Enum):
+        enum_class = col_type.enum_class
+        if enum_class is None:
+            return None, None
+        # 按成员名存取，与 SQLAlchemy 默认的持久化方式一致
+        return (lambda v: v.name), (lambda v: enum_class[v])
+    if isinstance(col_type, Uuid):
+        return (str, uuid.UUID) if col_type.as_uuid else (None, None)
+    if isinstance(col_type, LargeBinary):
+        return (lambda v: base64.b64encode(v).decode()), base64.b64decode
+    if col_type.python_type in (str, int, float, bool, dict, list):
+        return None, None
+    raise NotImplementedError(f"不支持缓存的列类型: {col_type!r}")
+
+
+@cache
+def _user_columns() -> Optional[tuple]:
+    """User 模型的列属性及其 (序列化, 还原) 方法；存在无法还原的列时返回 None，不缓存用户"""
+    columns = []
+    for attr in sa_inspect(User).mapper.column_attrs:
+        try:
+            dump, restore = _column_codec(attr.columns[0].type)
+        except NotImplementedError as e:
+            logger.warning(f"用户信息不使用缓存: {attr.key}, {e}")
+            return None
+        columns.append((attr.key, dump, restore))
+    return tuple(columns)
+
+
+def _dump_user(user: User) -> str:
+    data = {}
+    for key, dump, _ in _user_columns():
+        value = getattr(user, key)
+        data[key] = dump(value) if dump is not None and value is not None else value
+    return orjson.dumps(data).decode()
+
+
+def _load_user(blob: str) -> User:
+    data = orjson.loads(blob)
+    for key, _, restore in _user_columns():
+        if restore is not None and data.get(key) is not None:
+            data[key] = restore(data[key])
+    return User(**data)
+
+
+async def invalidate_user_cache(user_id) -> None:
+    """用户信息变更后清除缓存"""
+    await get_redis_sync().delete(f"{USER_CACHE_PREFIX}:{user_id}")
 
 
 async def get_user_from_db(user_id: str) -> User:
     """
-    根据用户ID从数据库获取用户信息
+    根据用户ID从数据库获取用户信息，结果在Redis中缓存 USER_CACHE_EXPIRE 秒
     :param user_id: 用户ID (字符串形式)
-    :return: User 模型实例
+    :return: User 模型实例（缓存命中时为未绑定会话的实例）
     :raises HTTPException: 用户不存在时返回404错误
     """
     # 将字符串ID转换为整数（根据实际ID类型调整）
@@ -45,6 +135,14 @@ async def get_user_from_db(user_id: str) -> User:
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid user ID format")
 
+    redis = get_redis_sync()
+    cache_key = f"{USER_CACHE_PREFIX}:{user_id_int}"
+    cacheable = _user_columns() is not None
+    if cacheable:
+        cached = await redis.get(cache_key)
+        if cached:
+            return _load_user(cached)
+
     # 获取数据库会话
     async with get_db_session() as session:
         stmt = select(User).where(User.id == user_id_int)
@@ -56,6 +154,8 @@ async def get_user_from_db(user_id: str) -> User:
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"User with ID {user_id} not found")
 
+    if cacheable:
+        await redis.set(cache_key, _dump_user(user), expire=USER_CACHE_EXPIRE)
     return user
 
 
@@ -64,18 +164,16 @@ async def get_current_user(request: Request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(401, "无效的认证凭证")
-    token = auth_header.split(" ")[1]
-    print("=" * 10)
-    print(f"token: {token}")
-    print("=" * 10)
+    token = auth_header[7:]
+    logger.debug("token received len=%d", len(token))
 
     try:
         # 解码JWT令牌
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = await _decode_token(token)
         user_id: str = payload.get("sub")
         if not user_id:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="无效的认证凭证")
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="令牌验证失败")
 
     # 从数据库获取用户（示例使用模拟数据库）
@@ -90,14 +188,14 @@ async def try_get_current_user(request: Request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         return None
-    token = auth_header.split(" ")[1]
+    token = auth_header[7:]
     try:
         # 解码JWT令牌
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = await _decode_token(token)
         user_id: str = payload.get("sub")
         if not user_id:
             return None
-    except JWTError:
+    except InvalidTokenError:
         return None
 
     # 从数据库获取用户（示例使用模拟数据库）
@@ -109,27 +207,39 @@ async def try_get_current_user(request: Request):
     return user
 
 
+# 设备登记脚本：ZCARD → 超限时删除最早设备 → ZADD，一次往返原子完成
+_ADD_DEVICE_LUA = """
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0)
+    if #oldest > 0 then
+        redis.call('ZREM', KEYS[1], oldest[1])
+    end
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+return 1
+"""
+
+
 class DeviceManager:
     """设备管理服务"""
 
     def __init__(self):
-        self.redis = get_redis_sync()
+        self._redis = None
+
+    @property
+    def redis(self):
+        # 首次使用时再获取Redis服务，模块导入时不依赖Redis初始化顺序
+        if self._redis is None:
+            self._redis = get_redis_sync()
+        return self._redis
 
     async def add_device(
         self, user_id: str, device_id: str, max_devices: int = MAX_DEVICES_PER_USER
     ):
-        """添加设备并处理设备限制"""
+        """添加设备并处理设备限制（使用当前时间戳作为score）"""
         key = f"user:{user_id}:devices"
-        current_count = await self.redis.zcard(key)
-
-        # 设备数超限时删除最早设备
-        if current_count >= max_devices:
-            oldest_devices = await self.redis.zrange(key, 0, 0)
-            if oldest_devices:
-                await self.redis.zrem(key, oldest_devices[0])
-
-        # 添加新设备（使用当前时间戳作为score）
-        await self.redis.zadd(key, {device_id: datetime.now().timestamp()})
+        await self.redis.eval(_ADD_DEVICE_LUA, 1, key, device_id, datetime.now().timestamp(), max_devices)
 
     async def is_active(self, user_id: str, device_id: str) -> bool:
         """检查设备是否在活跃列表中"""
@@ -142,6 +252,9 @@ class DeviceManager:
         await self.redis.zrem(key, device_id)
 
 
+_device_manager = DeviceManager()
+
+
 def create_access_token(user_id: str, device_id: str) -> str:
     """创建绑定设备的JWT令牌"""
     payload = {
@@ -155,18 +268,18 @@ def create_access_token(user_id: str, device_id: str) -> str:
 async def verify_token(token: str = Depends(oauth2_scheme)) -> str:
     """验证JWT令牌并提取用户ID"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = await _decode_token(token)
         user_id: str = payload.get("sub")
         device_id: str = payload.get("device_id")
         if not user_id or not device_id:
             raise HTTPException(status.HTTP_401_UNAUTHORIZED, "无效令牌")
 
         # 检查设备是否在活跃列表中
-        if not await DeviceManager().is_active(user_id, device_id):
+        if not await _device_manager.is_active(user_id, device_id):
             raise HTTPException(status.HTTP_401_UNAUTHORIZED, "设备会话已失效")
 
         return user_id
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "令牌验证失败")
 
 
@@ -192,25 +305,21 @@ def auth_required(max_devices: int = MAX_DEVICES_PER_USER) -> Callable:
             auth_header = request.headers.get("Authorization")
             if not auth_header or not auth_header.startswith("Bearer "):
                 raise HTTPException(status.HTTP_401_UNAUTHORIZED, "无效的认证凭证")
-            token = auth_header.split(" ")[1]
+            token = auth_header[7:]
             user_id = await verify_token(token)
-            # 从数据库获取用户（示例使用模拟数据库）
+            device_id = generate_device_fingerprint(request)
             user = await get_user_from_db(user_id)
             if not user:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
+            # 确认用户存在后再添加/更新设备
+            await _device_manager.add_device(user_id, device_id, max_devices)
             request.state.user = user
-            device_id = generate_device_fingerprint(request)
             request.state.device_id = device_id
-            # 添加/更新设备
-            await DeviceManager().add_device(user_id, device_id, max_devices)
             result = await endpoint(self, request, *args, **kwargs)
             if result:
-                if isinstance(result, JSONResponse):
-                    response_content = json.loads(result.body)
-                    if isinstance(response_content, dict) and str(response_content.get('code')) == '10000':
-                        # 记录用户接口行为
-                        await record_user_interface_behavior(request, user)
-                elif isinstance(result, StreamingResponse):
+                # 业务码由 BaseHTTPEndpoint 的响应方法记录在 custom_code 上，无需重新解析响应体
+                if isinstance(result, StreamingResponse) or str(getattr(result, "custom_code", None)) == '10000':
+                    # 记录用户接口行为
                     await record_user_interface_behavior(request, user)
             return result
 
@@ -242,7 +351,7 @@ def get_client_ip(request: Request) -> str:
     # 先拿 X-Forwarded-For，取第一个
     xff = request.headers.get("X-Forwarded-For")
     if xff:
-        return xff.split(",")[0].strip()
+        return xff.partition(",")[0].strip()
     # 降级到 X-Real-IP
     xri = request.headers.get("X-Real-IP")
     if xri:
@@ -255,44 +364,31 @@ async def parse_request_data_to_json(request: Request) -> str:
     解析请求参数并统一转换为JSON格式字典
     支持 JSON body、form-data、url参数等多种形式
     """
-    if request.method in ("POST", "PUT", "DELETE"):
+    headers = request.headers
+    # 无请求体（Content-Length 为 0 或缺失且非分块传输）时直接使用 URL 参数，不再读取/解析请求体
+    has_body = headers.get("content-length", "0") != "0" or "transfer-encoding" in headers
+    if request.method in ("POST", "PUT", "DELETE") and has_body:
         # 获取内容类型
-        content_type = request.headers.get("content-type", "").lower()
+        content_type = headers.get("content-type", "").lower()
 
-        if "application/json" in content_type:
-            # JSON body 数据
-            try:
-                result = await request.json()
-            except json.JSONDecodeError:
-                result = {}
-
-        elif "multipart/form-data" in content_type:
-            # form-data 表单数据
-            form_data = await request.form()
-            result = dict(form_data)
-
-        elif "application/x-www-form-urlencoded" in content_type:
-            # URL编码的表单数据
+        if "multipart/form-data" in content_type or "application/x-www-form-urlencoded" in content_type:
+            # form-data / URL编码的表单数据
             form_data = await request.form()
             result = dict(form_data)
 
         else:
-            # 默认尝试解析为 JSON
+            # JSON body 数据，其它类型也默认尝试解析为 JSON
             try:
-                result = await request.json()
-            except json.JSONDecodeError:
+                result = orjson.loads(await request.body())
+            except orjson.JSONDecodeError:
                 result = {}
         if not result:
             # 如果没有解析到数据，尝试从 URL 参数中获取
             result = dict(request.query_params)
 
-    elif request.method in ["GET", "PATCH"]:
-        # URL 查询参数
-        result = dict(request.query_params)
-
     else:
-        # 其他请求方法默认使用查询参数
+        # GET / PATCH 等其他请求方法以及无请求体的请求使用查询参数
         result = dict(request.query_params)
     if result is None:
         result = {}
-    return json.dumps(result)
\ No newline at end of file
+    return orjson.dumps(result, default=str).decode()
\ No newline at end of file
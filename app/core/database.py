@@ -1,5 +1,8 @@
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Dict
+import asyncio
+import functools
+import logging
+from contextvars import ContextVar
+from typing import AsyncGenerator, Dict, Optional, Tuple
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncAttrs,
@@ -7,103 +10,349 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import MetaData, event
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
 from .config import settings
 from .config import DatabaseConfig
 
+logger = logging.getLogger(__name__)
 
-class Base(AsyncAttrs, DeclarativeBase):
+# 当前上下文中最外层 dbm.session("default") 打开的会话，嵌套调用直接复用
+ctx_session: ContextVar[Optional[AsyncSession]] = ContextVar("ctx_session", default=None)
+
+
+class Base(DeclarativeBase):
     """数据库模型基类"""
     pass
 
-class ExternalBase(AsyncAttrs, DeclarativeBase):
+
+class LazyBase(AsyncAttrs, Base):
+    """需要通过 awaitable_attrs 异步加载懒加载关系的模型基类"""
+    __abstract__ = True
+
+
+# 外部库/时序库的表与主库共用同一个映射注册表，仅使用各自独立的 MetaData；
+# MetaData.info["bind_key"] 为目标库在 DatabaseManager 中注册的名称，由 RoutingSession 路由
+external_metadata = MetaData(info={"bind_key": "external"})
+timescale_metadata = MetaData(info={"bind_key": "timescaledb"})
+
+
+class ExternalBase(Base):
     """外部数据库模型基类"""
-    pass
+    __abstract__ = True
+    metadata = external_metadata
+
 
-class TimescaledbBase(AsyncAttrs, DeclarativeBase):
+class TimescaledbBase(Base):
     """时序数据库模型基类"""
-    pass
+    __abstract__ = True
+    metadata = timescale_metadata
+
+
+def _bind_key(table) -> Optional[str]:
+    """表级 info["bind_key"] 优先，其次为所属 MetaData 的 bind_key"""
+    info = getattr(table, "info", None)
+    if info and "bind_key" in info:
+        return info["bind_key"]
+    metadata = getattr(table, "metadata", None)
+    return metadata.info.get("bind_key") if metadata is not None else None
+
+
+class RoutingSession(Session):
+    """按表的 bind_key 将语句路由到对应数据库的引擎，未指定 bind_key 时使用会话默认引擎"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        # ORM 语句按映射类的表路由；Core 的 insert/update/delete 按语句目标表路由
+        table = mapper.local_table if mapper is not None else getattr(clause, "table", None)
+        if table is not None:
+            bind_key = _bind_key(table)
+            if bind_key is not None:
+                entry = dbm._dbs.get(bind_key)
+                if entry is None:
+                    # 不回退到默认库，避免路由模型的读写静默落到主库
+                    raise RuntimeError(f"数据库 {bind_key} 未注册，无法路由表 {table.name}")
+                return entry.engine.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+    def connection(self, *args, **kwargs):
+        # 直接在连接上执行的语句无法判断读写，一律按写入处理
+        self.info[_HAS_WRITES] = True
+        return super().connection(*args, **kwargs)
+
+
+# session.info 中的写入标记：执行过非 SELECT 语句、flush 过或直接取用过连接
+_HAS_WRITES = "has_writes"
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _flag_write_statement(orm_execute_state) -> None:
+    # insert/update/delete 以及 text() 等无法识别的语句都按写入处理
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _flag_flush(session, flush_context) -> None:
+    session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+@event.listens_for(RoutingSession, "after_rollback")
+def _reset_write_flag(session) -> None:
+    session.info.pop(_HAS_WRITES, None)
+
+
+def _needs_commit(session: AsyncSession) -> bool:
+    """有写入标记或未 flush 的改动时才需要 COMMIT
+
+    只执行过 SELECT 的会话不提交，关闭时回滚；通过 select() 调用有副作用的数据库函数时，
+    需在提交前执行 session.connection() 将会话标记为写入
+    """
+    return bool(session.info.get(_HAS_WRITES) or session.new or session.dirty or session.deleted)
+
+
+def _engine_kwargs(cfg: DatabaseConfig) -> dict:
+    """根据数据库配置构建 create_async_engine 的参数"""
+    if cfg.use_null_pool:
+        # 不保留空闲连接，每次使用时新建并在归还时关闭
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_recycle": cfg.pool_recycle,
+        "pool_size": cfg.pool_size,
+        "max_overflow": cfg.max_overflow,
+        "pool_timeout": cfg.pool_timeout,
+        "pool_pre_ping": cfg.pool_pre_ping,
+    }
+
+
+class _DBEntry:
+    """单个数据库的配置、引擎与会话工厂"""
+    __slots__ = ("config", "engine", "factory", "prewarm")
+
+    def __init__(self, config: DatabaseConfig, engine: AsyncEngine, factory: async_sessionmaker, prewarm: bool):
+        self.config = config
+        self.engine = engine
+        self.factory = factory
+        self.prewarm = prewarm
+
 
 class DatabaseManager:
     def __init__(self):
-        self._configs: Dict[str, DatabaseConfig] = {}
-        self._engines: Dict[str, AsyncEngine] = {}
-        self._factories: Dict[str, sessionmaker] = {}
+        self._dbs: Dict[str, _DBEntry] = {}
+        # 连接参数相同的逻辑库共用一个引擎（连接池），键为 (url, pool_size, max_overflow, use_null_pool)
+        self._engine_by_key: Dict[Tuple[str, int, int, bool], AsyncEngine] = {}
+        # 默认数据库：名为 "default" 的库或第一个注册的库，未注册时为 None
+        self._default: Optional[_DBEntry] = None
         self._initialized = False
+        # 按名称解析数据库条目的结果缓存；注册/关闭时清空
+        self._entry = functools.lru_cache(maxsize=16)(self._resolve_entry)
 
-    async def register(self, cfg: "DatabaseConfig") -> None:
+    def register(self, cfg: "DatabaseConfig", name: Optional[str] = None, prewarm: Optional[bool] = None) -> None:
+        """注册数据库；name 为逻辑名称（即模型的 bind_key），缺省使用 cfg.db；prewarm 不为 None 时覆盖 cfg.prewarm"""
+        # create_async_engine 只构建引擎对象，连接在首次使用时才建立，因此注册无需 await
         # 仅在需要时创建引擎与工厂
-        if cfg.db in self._engines:
+        name = name or cfg.db
+        if name in self._dbs:
             return
-        eng = create_async_engine(cfg.url,
-                                  pool_recycle=cfg.pool_recycle,
-                                  pool_size=cfg.pool_size,
-                                  max_overflow=cfg.max_overflow,
-                                  pool_timeout=cfg.pool_timeout,
-                                  future=True,
-                                  pool_pre_ping=True,
-                                  echo=False)
-        self._configs[cfg.db] = cfg
-        self._engines[cfg.db] = eng
-        self._factories[cfg.db] = sessionmaker(eng, class_=AsyncSession, expire_on_commit=cfg.expire_on_commit)
-        self._initialized = True
+        key = (cfg.url, cfg.pool_size, cfg.max_overflow, cfg.use_null_pool)
+        eng = self._engine_by_key.get(key)
+        if eng is None:
+            eng = create_async_engine(cfg.url, **_engine_kwargs(cfg))
+            self._engine_by_key[key] = eng
+        else:
+            logger.info(f"数据库 {name} 与已注册的库连接参数相同，复用同一引擎")
+        factory = async_sessionmaker(eng, sync_session_class=RoutingSession,
+                                     expire_on_commit=cfg.expire_on_commit, autoflush=cfg.autoflush)
+        entry = _DBEntry(cfg, eng, factory, cfg.prewarm if prewarm is None else prewarm)
+        self._dbs[name] = entry
+        if self._default is None or name == "default":
+            self._default = entry
+        self._entry.cache_clear()
 
     async def init_databases(self) -> None:
         # 如果已初始化，则直接返回；否则由外部调用逐个注册后初始化
         if self._initialized:
             return
-        # 这里可以按需自动启动已注册的 cfg（如果有默认配置来源）
-        # 例：await self.register(DBConfig(...))
+        # 预热连接池：启动时建立 pool_size 个连接并归还到池中，避免首批请求承担建连延迟
+        # 共用引擎的逻辑库只预热一次
+        warm = {}
+        for name, entry in self._dbs.items():
+            if entry.prewarm and not entry.config.use_null_pool:
+                warm.setdefault(id(entry.engine), (name, entry))
+        await asyncio.gather(*(self._prewarm(name, entry) for name, entry in warm.values()))
         self._initialized = True
 
+    async def _prewarm(self, name: str, entry: _DBEntry) -> None:
+        eng = entry.engine
+        results = await asyncio.gather(*(eng.connect() for _ in range(entry.config.pool_size)), return_exceptions=True)
+        conns = [conn for conn in results if not isinstance(conn, BaseException)]
+        # close() 将连接归还到连接池，并不会断开
+        await asyncio.gather(*(conn.close() for conn in conns))
+        failed = len(results) - len(conns)
+        if failed:
+            logger.warning(f"数据库 {name} 连接池预热失败 {failed}/{len(results)}: {next(r for r in results if isinstance(r, BaseException))}")
+        else:
+            logger.info(f"数据库 {name} 连接池预热完成: {len(conns)} 个连接")
+
     async def shutdown(self) -> None:
-        # 统一清理资源
-        for eng in self._engines.values():
-            await eng.dispose()
-        self._engines.clear()
-        self._factories.clear()
+        # 统一清理资源：并发释放各引擎，单个引擎失败不影响其它引擎的清理
+        keys = list(self._engine_by_key)
+        results = await asyncio.gather(*(eng.dispose() for eng in self._engine_by_key.values()), return_exceptions=True)
+        for key, result in zip(keys, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"关闭数据库连接池 {key[0].rpartition('@')[2]} 时出错: {result}")
+        self._dbs.clear()
+        self._engine_by_key.clear()
+        self._default = None
+        self._entry.cache_clear()
         self._initialized = False
 
+    async def check_db_health(self) -> Dict[str, bool]:
+        """并发检查所有已注册数据库的连接，直接在连接上执行 SELECT 1，不经过 ORM 会话"""
+
+        async def probe(eng: AsyncEngine) -> bool:
+            try:
+                async with eng.connect() as conn:
+                    await conn.exec_driver_sql("SELECT 1")
+                return True
+            except Exception as e:
+                logger.warning(f"数据库健康检查失败: {eng.url.database}, {e}")
+                return False
+
+        # 共用引擎的逻辑库只探测一次
+        engines = {id(entry.engine): entry.engine for entry in self._dbs.values()}
+        results = await asyncio.gather(*(probe(eng) for eng in engines.values()))
+        status = dict(zip(engines, results))
+        return {name: status[id(entry.engine)] for name, entry in self._dbs.items()}
+
+    def _resolve_entry(self, name: str) -> _DBEntry:
+        entry = self._dbs.get(name, self._default)
+        if entry is None:
+            raise RuntimeError("数据库未初始化，请先调用 init_databases()")
+        return entry
+
     async def get_session(self, name: str = "default") -> AsyncSession:
-        if not self._initialized:
-            await self.init_databases()
-        factory = self._factories.get(name)
-        if factory is None:
-            factory = self._factories.get("default")
+        # 数据库须在启动阶段通过 init_databases() 注册，这里不再逐次检查初始化状态
         # 这里直接返回一个 AsyncSession 对象，调用方再决定上下文管理
-        return factory()
+        return self._entry(name).factory()
 
-    @asynccontextmanager
-    async def session(self, name: str = "default"):
+    def session(self, name: str = "default") -> "_SessionCtx":
         """
         使用示例:
         async with dbm.session("default") as session:
             ...
+
+        默认库的会话在同一上下文内复用：嵌套的 dbm.session("default") 直接返回外层会话，
+        提交/回滚由外层负责。AsyncSession 不支持并发使用，外层会话内用 asyncio.gather
+        并发执行的查询需各自使用 get_session() 获取独立会话
         """
-        sess = await self.get_session(name)
-        async with sess as session:
-            try:
-                yield session
-                await session.commit()
-            except Exception:
+        if name == "default":
+            existing = ctx_session.get()
+            if existing is not None:
+                return _ReusedSessionCtx(existing)
+            return _SessionCtx(self._entry(name).factory, track=True)
+        return _SessionCtx(self._entry(name).factory)
+
+
+class _SessionCtx:
+    """会话上下文：正常退出时提交，异常时回滚，最后关闭会话
+
+    手写 __aenter__/__aexit__，避免 asynccontextmanager 每次调用创建生成器帧
+    """
+    __slots__ = ("_factory", "_session", "_track", "_token")
+
+    def __init__(self, factory: async_sessionmaker, track: bool = False):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+        # track 为 True 时将会话登记到 ctx_session，供嵌套调用复用
+        self._track = track
+        self._token = None
+
+    async def __aenter__(self) -> AsyncSession:
+        self._session = self._factory()
+        session = await self._session.__aenter__()
+        if self._track:
+            self._token = ctx_session.set(session)
+        return session
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        session = self._session
+        try:
+            # 只读或从未使用过的会话不发送 COMMIT，只读事务由 rollback 结束
+            if exc_type is None and _needs_commit(session):
+                try:
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+            elif exc_type is not None or session.in_transaction():
                 await session.rollback()
-                raise
+        finally:
+            if self._token is not None:
+                ctx_session.reset(self._token)
+                self._token = None
+            await session.__aexit__(exc_type, exc, tb)
+        return False
+
+
+class _ReusedSessionCtx:
+    """复用外层会话的上下文，不做提交/回滚/关闭"""
+    __slots__ = ("_session",)
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def __aenter__(self) -> AsyncSession:
+        return self._session
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        return False
 
 
 dbm = DatabaseManager()
 
+_init_lock = asyncio.Lock()
+
+
 async def init_databases():
-    """初始化数据库"""
-    await dbm.register(settings.default_db)
-    await dbm.init_databases()
+    """初始化数据库（幂等，可被多个启动路径并发调用）"""
+    if dbm._initialized:
+        return
+    async with _init_lock:
+        if dbm._initialized:
+            return
+        dbm.register(settings.default_db, "default")
+        # 按模型 MetaData 的 bind_key 注册路由库；没有映射表的库只创建引擎、不预热，首次使用时才建立连接
+        dbm.register(settings.timescaledb, timescale_metadata.info["bind_key"],
+                     prewarm=settings.timescaledb.prewarm and bool(timescale_metadata.tables))
+        if settings.external_db is not None:
+            dbm.register(settings.external_db, external_metadata.info["bind_key"],
+                         prewarm=settings.external_db.prewarm and bool(external_metadata.tables))
+        await dbm.init_databases()
 
 async def close_databases():
-    """关闭数据库"""
+    """关闭数据库（由 DatabaseManager.shutdown 统一并发释放所有引擎，旧的按全局变量逐个关闭的 close_db 已移除）"""
     await dbm.shutdown()
 
 
+async def check_db_health() -> Dict[str, bool]:
+    """检查所有数据库连接健康状况"""
+    return await dbm.check_db_health()
+
+
+def get_db_session(db_type: str = "default"):
+    """获取指定数据库的会话上下文管理器，退出时自动提交/回滚
+
+    使用示例:
+    async with get_db_session("news") as session:
+        ...
+    """
+    return dbm.session(db_type)
+
+
 
 # # 创建多个数据库引擎和会话工厂
 # default_engine = None
@@ -406,54 +655,6 @@ async def close_databases():
 #         await conn.run_sync(Base.metadata.create_all)
 #
 #
-# async def close_db() -> None:
-#     """关闭所有数据库连接"""
-#     global default_engine, news_engine, market_engine, ai_interpretation_engine, realtime_market_engine, \
-#         hot_spot_engine, timescaledb_engine, stock_news_engine
-#     global default_session_factory, news_session_factory, market_session_factory, ai_interpretation_session_factory, \
-#         realtime_market_session_factory, hot_spot_session_factory, timescaledb_session_factory, \
-#         stock_news_session_factory
-#
-#     if default_engine:
-#         await default_engine.dispose()
-#         default_engine = None
-#         default_session_factory = None
-#
-#     if news_engine:
-#         await news_engine.dispose()
-#         news_engine = None
-#         news_session_factory = None
-#
-#     if market_engine:
-#         await market_engine.dispose()
-#         market_engine = None
-#         market_session_factory = None
-#
-#     if ai_interpretation_engine:
-#         await ai_interpretation_engine.dispose()
-#         ai_interpretation_engine = None
-#         ai_interpretation_session_factory = None
-#
-#     if realtime_market_engine:
-#         await realtime_market_engine.dispose()
-#         realtime_market_engine = None
-#         realtime_market_session_factory = None
-#
-#     if hot_spot_engine:
-#         await hot_spot_engine.dispose()
-#         hot_spot_engine = None
-#         hot_spot_session_factory = None
-#
-#     if timescaledb_engine:
-#         await timescaledb_engine.dispose()
-#         timescaledb_engine = None
-#         timescaledb_session_factory = None
-#
-#     if stock_news_engine:
-#         await stock_news_engine.dispose()
-#         stock_news_engine = None
-#         stock_news_session_factory = None
-#
 # # 获取直接的数据库会话 - 用于特殊场景
 # async def get_raw_session(db_type: str = "default") -> AsyncSession:
 #     """获取原始数据库会话对象 - 需要手动管理
@@ -475,56 +676,3 @@ async def close_databases():
 #         session_factory = default_session_factory
 #
 #     return session_factory()
-#
-#
-# # 数据库健康检查
-# async def check_db_health() -> dict:
-#     """检查所有数据库连接健康状况"""
-#     health_status = {
-#         'default': False,
-#         'news': False,
-#         'market': False,
-#         'ai_interpretation': False
-#     }
-#
-#     try:
-#         # 检查默认数据库
-#         async with get_db_session("default") as db:
-#             await db.execute("SELECT 1")
-#             health_status['default'] = True
-#     except Exception as e:
-#         print(f"Default database health check failed: {e}")
-#
-#     try:
-#         # 检查新闻数据库
-#         async with get_db_session("news") as db:
-#             await db.execute("SELECT 1")
-#             health_status['news'] = True
-#     except Exception as e:
-#         print(f"News database health check failed: {e}")
-#
-#     try:
-#         # 检查市场数据库
-#         async with get_db_session("market") as db:
-#             await db.execute("SELECT 1")
-#             health_status['market'] = True
-#     except Exception as e:
-#         print(f"Market database health check failed: {e}")
-#
-#     try:
-#         # 检查AI解读数据库
-#         async with get_db_session("ai_interpretation") as db:
-#             await db.execute("SELECT 1")
-#             health_status['ai_interpretation'] = True
-#     except Exception as e:
-#         print(f"AI interpretation database health check failed: {e}")
-#
-#     try:
-#         # 检查实时市场数据库
-#         async with get_db_session("realtime_market") as db:
-#             await db.execute("SELECT 1")
-#             health_status['realtime_market'] = True
-#     except Exception as e:
-#         print(f"Realtime market database health check failed: {e}")
-#
-#     return health_status
\ No newline at end of file
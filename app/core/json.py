@@ -0,0 +1,33 @@
+"""JSON 序列化入口：优先使用 orjson，未安装时退回标准库
+
+dumps 统一返回 bytes（Redis 等写入端可直接使用），loads 同时接受 bytes 与 str。
+datetime/date 编码为 ISO 8601 字符串，可用 datetime.fromisoformat 还原。
+"""
+from datetime import date, datetime
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+
+    def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None, option: Optional[int] = None) -> bytes:
+        return orjson.dumps(obj, default=default, option=option)
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover
+    import json as _json
+
+    def _iso_default(obj):
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+    def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None, option: Optional[int] = None) -> bytes:
+        def _default(o):
+            if isinstance(o, (datetime, date)):
+                return o.isoformat()
+            if default is not None:
+                return default(o)
+            return _iso_default(o)
+        return _json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    loads = _json.loads
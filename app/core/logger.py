@@ -1,11 +1,20 @@
 import os
+import io
+import atexit
 import logging
-import json
+import orjson
+import queue
+import re
+import signal
+import threading
 import time
-from datetime import datetime, timedelta
-from logging.handlers import TimedRotatingFileHandler
+import weakref
+from datetime import date, datetime, timedelta
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, TimedRotatingFileHandler
 from functools import wraps
 
+from .config import settings
+
 # 确保日志目录存在
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -20,6 +29,9 @@ DEFAULT_LOG_FORMAT = '%(asctime)s [%(levelname)s] [qid:%(question_openid)s] %(mo
 DETAILED_LOG_FORMAT = '%(asctime)s [%(levelname)s] [qid:%(question_openid)s] %(module)s:%(funcName)s:%(lineno)d - %(message)s'
 JSON_LOG_FORMAT = '%(message)s'
 
+# 初始化过程中的诊断信息，统一在模块末尾通过日志输出一次
+_init_diagnostics = []
+
 class QuestionLogFilter(logging.Filter):
     """确保日志包含question_openid"""
     def filter(self, record):
@@ -30,9 +42,22 @@ class QuestionLogFilter(logging.Filter):
 
 class JsonFormatter(logging.Formatter):
     """JSON格式的日志格式化器"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 同一秒内的记录复用已格式化的时间前缀
+        self._cached_second = None
+        self._cached_prefix = ''
+
+    def _format_timestamp(self, created):
+        second = int(created)
+        if second != self._cached_second:
+            self._cached_second = second
+            self._cached_prefix = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        return f"{self._cached_prefix}.{int((created - second) * 1000):03d}"
+
     def format(self, record):
         log_data = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'timestamp': self._format_timestamp(record.created),
             'level': record.levelname,
             'module': record.module,
             'line': record.lineno,
@@ -40,16 +65,9 @@ class JsonFormatter(logging.Formatter):
         }
         
         # 添加其他额外字段
-        if hasattr(record, 'extra') and isinstance(record.extra, dict):
-            # 确保对列表和字典进行适当处理
-            extra_data = {}
-            for k, v in record.extra.items():
-                if isinstance(v, (list, dict)):
-                    # 对于列表和字典，保留原始结构但确保可序列化
-                    extra_data[k] = self._ensure_serializable(v)
-                else:
-                    extra_data[k] = v
-            log_data.update(extra_data)
+        extra = getattr(record, 'extra', None)
+        if isinstance(extra, dict):
+            log_data.update(extra)
             
         # 处理消息
         if isinstance(record.msg, dict):
@@ -60,8 +78,12 @@ class JsonFormatter(logging.Formatter):
         # 添加异常信息
         if record.exc_info:
             log_data['exception'] = self.formatException(record.exc_info)
-            
-        return json.dumps(log_data, ensure_ascii=False)
+
+        try:
+            return orjson.dumps(log_data, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # 含有不可序列化的对象时才做一次完整转换
+            return orjson.dumps(self._ensure_serializable(log_data), option=orjson.OPT_NON_STR_KEYS).decode()
     
     def _ensure_serializable(self, obj):
         """确保对象可JSON序列化"""
@@ -75,6 +97,69 @@ class JsonFormatter(logging.Formatter):
             # 将不可序列化的对象转换为字符串
             return str(obj)
 
+class _RecordQueueHandler(QueueHandler):
+    """入队原始 LogRecord，保留 dict 类型的 msg 供 JsonFormatter 使用
+
+    默认的 prepare 会在调用线程里执行 self.format 并清空 args/exc_info；
+    这里不做任何格式化，格式化与异常堆栈渲染都在监听线程中完成。
+    监听方是同进程线程，记录无需可 pickle，因此保留 exc_info 原样。
+    """
+    def prepare(self, record):
+        return record
+
+# 共用的格式化器与控制台处理器
+_DETAILED_FMT = logging.Formatter(DETAILED_LOG_FORMAT)
+_JSON_FMT = JsonFormatter()
+_CONSOLE = logging.StreamHandler()
+_CONSOLE.setFormatter(_DETAILED_FMT)
+_CONSOLE.addFilter(QuestionLogFilter())
+
+# 写缓冲大小与定时刷盘间隔
+FILE_BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 1.0
+
+# 需要定时刷盘的文件处理器；增删与遍历都在 _buffered_lock 下进行，避免与刷盘线程并发修改
+_buffered_handlers = weakref.WeakSet()
+_buffered_lock = threading.Lock()
+
+
+def _register_buffered(handler):
+    with _buffered_lock:
+        _buffered_handlers.add(handler)
+
+
+def _flush_buffered():
+    """内存缓冲先写入文件处理器，再由文件处理器落盘"""
+    with _buffered_lock:
+        handlers = sorted(_buffered_handlers, key=lambda h: not isinstance(h, MemoryHandler))
+    for handler in handlers:
+        try:
+            handler.flush()
+        except Exception:
+            pass
+
+
+def _flush_loop():
+    """后台线程：定期将缓冲的日志写入磁盘"""
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        _flush_buffered()
+
+
+def _start_flusher():
+    threading.Thread(target=_flush_loop, name='log-flusher', daemon=True).start()
+
+
+_start_flusher()
+
+# 各日志记录器的队列处理器，fork 后需在子进程中重建队列并重启监听线程
+_queue_handlers = []
+
+def _next_midnight_epoch(day):
+    """返回 day 次日零点（本地时间）的时间戳"""
+    return time.mktime((day.year, day.month, day.day + 1, 0, 0, 0, 0, 0, -1))
+
+
 class DailyFileHandler(logging.FileHandler):
     """每日日志文件处理器，在日期变化时自动切换到新文件"""
     def __init__(self, base_filename, mode='a', encoding='utf-8'):
@@ -84,14 +169,25 @@ class DailyFileHandler(logging.FileHandler):
         self.encoding = encoding
         self.mode = mode
         self.today = datetime.now().date()
+        self._rollover_epoch = _next_midnight_epoch(self.today)
         
         # 生成当前的日志文件名
         current_filename = self._get_current_filename()
         
         # 初始化父类
         super().__init__(current_filename, mode, encoding)
-        print(f"创建日志处理器: {current_filename}")
+        _register_buffered(self)
     
+    def _open(self):
+        """以 64KB 写缓冲打开日志文件，由定时刷盘线程或 ERROR 级别日志触发落盘"""
+        raw = io.FileIO(self.baseFilename, self.mode)
+        return io.TextIOWrapper(
+            io.BufferedWriter(raw, buffer_size=FILE_BUFFER_SIZE),
+            encoding=self.encoding,
+            write_through=False,
+            line_buffering=False,
+        )
+
     def _get_current_filename(self):
         """基于当前日期获取日志文件名"""
         today_str = self.today.strftime('%Y-%m-%d')
@@ -99,21 +195,82 @@ class DailyFileHandler(logging.FileHandler):
     
     def emit(self, record):
         """发出日志记录，检查日期是否发生变化"""
-        today = datetime.now().date()
-        if today != self.today:
+        now = time.time()
+        if now >= self._rollover_epoch:
+            today = date.fromtimestamp(now)
             # 日期已变化，关闭旧文件并打开新文件
             if self.stream is not None:
+                self.stream.flush()
                 self.stream.close()
             self.today = today
+            self._rollover_epoch = _next_midnight_epoch(today)
             self.baseFilename = self._get_current_filename()
             self.stream = self._open()
-            print(f"日志日期已变化，切换到新文件: {self.baseFilename}")
             
             # 添加日期变更标记
             self.stream.write(f"\n--- 日期变更，日志继续于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---\n")
         
-        # 调用父类方法发出日志
-        super().emit(record)
+        # 消息与换行符合并为一次写入，不再每条记录 flush
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR:
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+class ReopenableFileHandler(logging.FileHandler):
+    """固定文件名的日志处理器，轮转交给 logrotate，收到 SIGHUP 时重新打开文件"""
+    def __init__(self, filename, mode='a', encoding='utf-8'):
+        super().__init__(filename, mode, encoding)
+        _register_buffered(self)
+        _reopenable_handlers.add(self)
+
+    _open = DailyFileHandler._open
+
+    def reopen(self):
+        """关闭当前文件并按原路径重新打开"""
+        self.acquire()
+        try:
+            if self.stream is not None:
+                self.stream.flush()
+                self.stream.close()
+            self.stream = self._open()
+        finally:
+            self.release()
+
+    def emit(self, record):
+        """写入日志记录，热路径上不再做日期判断"""
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR:
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+# 收到 SIGHUP 时需要重新打开的处理器
+_reopenable_handlers = weakref.WeakSet()
+
+
+def _reopen_on_sighup(signum, frame):
+    for handler in list(_reopenable_handlers):
+        try:
+            handler.reopen()
+        except Exception:
+            pass
+
+
+if not settings.logger.use_internal_rotation and hasattr(signal, 'SIGHUP') \
+        and threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGHUP, _reopen_on_sighup)
 
 # 更新设置日志记录器函数以使用自定义处理器
 def setup_logger(name, log_file, level=logging.INFO, formatter=None):
@@ -121,44 +278,91 @@ def setup_logger(name, log_file, level=logging.INFO, formatter=None):
     logger = logging.getLogger(name)
     logger.setLevel(level)
     
-    # 清除已有的处理器
+    # 清除已有的处理器（连同其队列监听线程）
     for handler in logger.handlers[:]:
+        listener = getattr(handler, 'listener', None)
+        if listener is not None:
+            listener.stop()
+            for h in listener.handlers:
+                h.flush()
+        if handler in _queue_handlers:
+            _queue_handlers.remove(handler)
         logger.removeHandler(handler)
     
-    # 使用自定义的DailyFileHandler
-    file_handler = DailyFileHandler(log_file, mode='a', encoding='utf-8')
+    # 默认由 DailyFileHandler 按天切换文件；关闭内部轮转时写固定文件，由 logrotate 负责轮转
+    if settings.logger.use_internal_rotation:
+        file_handler = DailyFileHandler(log_file, mode='a', encoding='utf-8')
+    else:
+        file_handler = ReopenableFileHandler(log_file, mode='a', encoding='utf-8')
     file_handler.setLevel(level)
     
-    # 写入日志开始标记
-    with open(file_handler.baseFilename, 'a', encoding='utf-8') as f:
-        f.write(f"\n--- 日志开始于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---\n")
+    # 写入日志开始标记（复用处理器已打开的文件流，监听线程启动前写入，不会并发）
+    file_handler.stream.write(f"\n--- 日志开始于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---\n")
+    file_handler.stream.flush()
     
-    # 设置格式
-    if formatter:
-        file_handler.setFormatter(formatter)
-    else:
-        file_handler.setFormatter(logging.Formatter(DETAILED_LOG_FORMAT))
+    # 设置格式（共用模块级格式化器实例）
+    file_handler.setFormatter(formatter or _DETAILED_FMT)
     
     # 添加过滤器确保包含question_openid
     file_handler.addFilter(QuestionLogFilter())
     
-    # 控制台处理器
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(level)
-    console_handler.setFormatter(logging.Formatter(DETAILED_LOG_FORMAT))
-    console_handler.addFilter(QuestionLogFilter())
-    
-    # 添加处理器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # 文件写入前先在内存中攒批，遇到 ERROR 或缓冲满时一次性写入；定时刷盘线程也会刷新
+    mem_handler = MemoryHandler(
+        capacity=settings.logger.buffer_records or 512,
+        flushLevel=logging.ERROR,
+        target=file_handler,
+        flushOnClose=True,
+    )
+    mem_handler.setLevel(level)
+    _register_buffered(mem_handler)
+    atexit.register(mem_handler.close)
+
+    # 调用线程只把记录放入队列，由后台监听线程统一完成格式化与文件/控制台写入
+    log_queue = queue.Queue(-1)
+    queue_handler = _RecordQueueHandler(log_queue)
+    queue_handler.setLevel(level)
+    # 在入队前补齐 question_openid
+    queue_handler.addFilter(QuestionLogFilter())
+    # 控制台处理器为所有日志记录器共用；级别已由记录器与队列处理器过滤
+    listener = QueueListener(log_queue, mem_handler, _CONSOLE, respect_handler_level=True)
+    listener.start()
+    # atexit 后注册先执行：先停止监听线程排空队列，再关闭内存缓冲写出剩余记录
+    atexit.register(listener.stop)
+    queue_handler.listener = listener
+    _queue_handlers.append(queue_handler)
+    logger.addHandler(queue_handler)
+    # 不再向根记录器传播，避免同一条记录被重复格式化/输出
+    logger.propagate = False
     
-    # 输出诊断信息
-    print(f"日志设置完成: {name}")
-    print(f"  - 日志级别: {logging.getLevelName(level)}")
-    print(f"  - 当前文件: {file_handler.baseFilename}")
+    # 记录诊断信息
+    _init_diagnostics.append(f"{name}[{logging.getLevelName(level)}] -> {file_handler.baseFilename}")
     
     return logger
 
+def _after_fork_in_child():
+    """fork 出的子进程（Celery prefork、gunicorn --preload 等）中不存在父进程的后台线程，
+    重建队列并重启监听线程与刷盘线程，否则记录只会堆积在无人消费的队列中"""
+    global _buffered_lock
+    # fork 时刷盘线程可能正持有该锁，子进程中没有线程会释放它，换用新锁
+    _buffered_lock = threading.Lock()
+    for queue_handler in _queue_handlers:
+        listener = queue_handler.listener
+        # 父进程的队列锁可能在 fork 时被占用，直接换用新队列
+        new_queue = queue.Queue(-1)
+        queue_handler.queue = new_queue
+        listener.queue = new_queue
+        listener._thread = None
+        listener.start()
+    _start_flusher()
+
+
+if hasattr(os, 'register_at_fork'):
+    # fork 前先落盘，避免缓冲中的记录被父子进程各写一遍
+    os.register_at_fork(before=_flush_buffered, after_in_child=_after_fork_in_child)
+
+# 带日期的日志文件名，标记文件不以 .log 结尾，不会被匹配
+_DATE_RE = re.compile(r'(.+)-(\d{4}-\d{2}-\d{2})\.log$')
+
 # 添加日志管理函数
 def clean_old_logs(log_dir=LOG_DIR, days_to_keep=30):
     """清理旧的日志文件，保留最近N天的日志"""
@@ -173,56 +377,47 @@ def clean_old_logs(log_dir=LOG_DIR, days_to_keep=30):
         with open(cleaning_marker, 'r') as f:
             marker_date = f.read().strip()
             if marker_date == today_str:
-                print(f"日志清理已经在今天({today_str})执行过，跳过")
+                _init_diagnostics.append(f"日志清理今天({today_str})已执行")
                 return
     
-    print(f"开始清理日志目录: {log_dir}")
+    removed = 0
     try:
         # 获取当前日期
         current_date = datetime.now().date()
         
-        # 查找日志目录中的所有文件
-        for filename in os.listdir(log_dir):
-            file_path = os.path.join(log_dir, filename)
-            
-            # 跳过目录和标记文件
-            if os.path.isdir(file_path) or filename.startswith('.'):
-                continue
-                
-            # 检查文件是否为日志文件
-            base_name, ext = os.path.splitext(filename)
-            if ext != '.log':
-                continue
-                
-            # 检查文件是否包含日期
-            date_part = None
-            if '-' in base_name:
-                parts = base_name.split('-')
-                # 尝试解析最后一部分作为日期
+        # 逐项遍历日志目录，文件名形如 app-2024-01-31.log
+        with os.scandir(log_dir) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                m = _DATE_RE.match(entry.name)
+                if not m:
+                    continue
+                d = m.group(2)
                 try:
-                    date_str = parts[-1]
-                    if len(date_str) == 10 and date_str.count('-') == 2:  # YYYY-MM-DD格式
-                        date_part = datetime.strptime(date_str, '%Y-%m-%d').date()
+                    date_part = date(int(d[:4]), int(d[5:7]), int(d[8:10]))
                 except ValueError:
-                    pass
-            
-            # 如果找到日期部分并且日期早于保留天数，删除文件
-            if date_part and (current_date - date_part).days > days_to_keep:
-                try:
-                    os.remove(file_path)
-                    print(f"已删除旧日志文件: {filename}")
-                except Exception as e:
-                    print(f"删除日志文件失败 {filename}: {str(e)}")
-        
+                    continue
+
+                # 日期早于保留天数，删除文件
+                if (current_date - date_part).days > days_to_keep:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except Exception as e:
+                        _init_diagnostics.append(f"删除日志文件失败 {entry.name}: {str(e)}")
+
         # 记录今天已经执行了清理
         with open(cleaning_marker, 'w') as f:
             f.write(today_str)
+        _init_diagnostics.append(f"已清理 {log_dir} 中 {removed} 个旧日志文件")
             
     except Exception as e:
-        print(f"清理日志目录失败: {str(e)}")
+        _init_diagnostics.append(f"清理日志目录失败: {str(e)}")
 
-# 确保日志系统初始化时清理旧日志
-clean_old_logs()
+# 确保日志系统初始化时清理旧日志（使用 logrotate 时由其负责保留策略）
+if settings.logger.use_internal_rotation:
+    clean_old_logs()
 
 # 创建主应用日志记录器
 main_logger = setup_logger('app', MAIN_LOG_FILE)
@@ -231,7 +426,7 @@ main_logger = setup_logger('app', MAIN_LOG_FILE)
 query_logger = setup_logger(
     'query', 
     QUERY_LOG_FILE, 
-    formatter=JsonFormatter()
+    formatter=_JSON_FMT
 )
 
 # 创建错误日志记录器
@@ -241,14 +436,10 @@ error_logger = setup_logger(
     level=logging.ERROR
 )
 
-# 输出诊断信息
-print(f"当前日志文件:")
-print(f"  - 主日志: {[h.baseFilename for h in main_logger.handlers if isinstance(h, logging.FileHandler)]}")
-print(f"  - 查询日志: {[h.baseFilename for h in query_logger.handlers if isinstance(h, logging.FileHandler)]}")
-print(f"  - 错误日志: {[h.baseFilename for h in error_logger.handlers if isinstance(h, logging.FileHandler)]}")
-
 # 输出初始化信息
 main_logger.info("日志系统初始化完成", extra={'question_openid': 'system'})
+main_logger.info(f"日志初始化: {' | '.join(_init_diagnostics)}", extra={'question_openid': 'system'})
+_init_diagnostics.clear()
 query_logger.info("查询日志系统初始化完成", extra={'question_openid': 'system'})
 error_logger.info("错误日志系统初始化完成", extra={'question_openid': 'system'})
 
@@ -270,12 +461,12 @@ def log_operation(logger=main_logger):
                 }
             )
             
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
             try:
                 result = func(*args, **kwargs)
                 
-                # 记录成功完成
-                execution_time = time.time() - start_time
+                # 记录成功完成（耗时以整数纳秒记录，不做字符串格式化）
+                elapsed_ns = time.perf_counter_ns() - start_ns
                 logger.info(
                     f"Completed {func.__name__}", 
                     extra={
@@ -283,14 +474,14 @@ def log_operation(logger=main_logger):
                         'extra': {
                             'operation': func.__name__, 
                             'status': 'completed',
-                            'execution_time': f"{execution_time:.4f}s"
+                            'execution_time_ns': elapsed_ns
                         }
                     }
                 )
                 return result
             except Exception as e:
                 # 记录异常
-                execution_time = time.time() - start_time
+                elapsed_ns = time.perf_counter_ns() - start_ns
                 error_logger.error(
                     f"Error in {func.__name__}: {str(e)}", 
                     exc_info=True,
@@ -299,7 +490,7 @@ def log_operation(logger=main_logger):
                         'extra': {
                             'operation': func.__name__, 
                             'status': 'error',
-                            'execution_time': f"{execution_time:.4f}s",
+                            'execution_time_ns': elapsed_ns,
                             'error_type': type(e).__name__
                         }
                     }
@@ -311,6 +502,8 @@ def log_operation(logger=main_logger):
 # 流程日志函数
 def log_process(question_openid='unknown', **kwargs):
     """记录处理流程的函数"""
+    if not settings.logger.verbose or not query_logger.isEnabledFor(logging.INFO):
+        return
     # 确保额外信息存储在extra字段中
     extra_data = {'extra': kwargs} if kwargs else {}
     extra_data['question_openid'] = question_openid
@@ -323,12 +516,37 @@ def log_process(question_openid='unknown', **kwargs):
     # 记录到查询日志
     query_logger.info(message, extra=extra_data)
 
+def make_stage_logger(stage_name):
+    """为固定阶段生成专用的流程日志函数，效果等同 log_process(question_openid, stage=stage_name, **kwargs)
+
+    消息后缀在创建时拼好，调用时只需填入 question_openid 与本次的额外字段。
+    """
+    suffix = f", stage: {stage_name}"
+
+    def log(question_openid='unknown', **kwargs):
+        if not settings.logger.verbose or not query_logger.isEnabledFor(logging.INFO):
+            return
+        kwargs['stage'] = stage_name
+        query_logger.info(
+            "Process question_openid: " + str(question_openid) + suffix,
+            extra={'extra': kwargs, 'question_openid': question_openid},
+        )
+
+    log.__name__ = f"log_{stage_name}"
+    return log
+
+# 常用阶段的流程日志函数
+LOG_LLM_CALL = make_stage_logger('llm_call')
+LOG_RETRIEVAL = make_stage_logger('retrieval')
+LOG_ANSWER = make_stage_logger('answer')
+
 # 错误日志函数
 def log_error(question_openid='unknown', error_message='Error occurred', exception=None, **kwargs):
     """记录错误的函数"""
+    if not error_logger.isEnabledFor(logging.ERROR):
+        return
     # 准备额外信息
-    extra_data = {'extra': kwargs} if kwargs else {}
-    extra_data['question_openid'] = question_openid
+    extra_data = {'extra': kwargs, 'question_openid': question_openid}
     
     # 如果提供了异常对象，添加异常详情
     if exception:
@@ -341,9 +559,10 @@ def log_error(question_openid='unknown', error_message='Error occurred', excepti
 # 性能日志函数
 def log_performance(question_openid='unknown', operation='unknown', execution_time=0, **kwargs):
     """记录性能数据的函数"""
+    if not main_logger.isEnabledFor(logging.INFO):
+        return
     # 准备额外信息
-    extra_data = {'extra': kwargs} if kwargs else {}
-    extra_data['question_openid'] = question_openid
+    extra_data = {'extra': kwargs, 'question_openid': question_openid}
     extra_data['extra']['operation'] = operation
     extra_data['extra']['execution_time'] = f"{execution_time:.4f}s"
     
@@ -357,10 +576,10 @@ class TimingContext:
         self.operation_name = operation_name
         self.question_openid = question_openid
         self.kwargs = kwargs
-        self.start_time = None
+        self.start_ns = None
         
     def __enter__(self):
-        self.start_time = time.time()
+        self.start_ns = time.perf_counter_ns()
         log_process(
             question_openid=self.question_openid,
             stage=self.operation_name,
@@ -369,7 +588,8 @@ class TimingContext:
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
-        execution_time = time.time() - self.start_time
+        # 单调时钟计时，不受系统时间调整影响
+        execution_time = (time.perf_counter_ns() - self.start_ns) / 1e9
         
         if exc_type is not None:
             # 发生异常
@@ -1,26 +1,46 @@
 import asyncio
 import logging
 import time
-from typing import List, Optional, Union, Callable, Any, Dict
+from typing import List, Optional, Union, Callable, Any, Dict, Tuple
 from contextlib import asynccontextmanager
-import aioredis
-from aioredis.connection import EncodableT
+from redis import asyncio as aioredis
+from redis import exceptions as redis_exceptions
+from redis.typing import EncodableT
 
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# 需要触发重连的网络类异常
+_NET_ERRORS = (
+    redis_exceptions.ConnectionError,
+    redis_exceptions.TimeoutError,
+    ConnectionResetError,
+    BrokenPipeError,
+    asyncio.exceptions.CancelledError,
+)
+
 
 class RedisService:
     """Redis服务类"""
 
-    def __init__(self):
+    def __init__(self, decode_responses: bool = True):
+        # 为 False 时返回原始 bytes，用于存放 msgpack 等二进制数据
+        self._decode_responses = decode_responses
         self.redis: Optional[aioredis.Redis] = None
+        self._pool: Optional[aioredis.ConnectionPool] = None
         self._connecting = False
+        # 连接尝试结束（成功或失败）时置位，供并发调用方等待
+        self._connected_event = asyncio.Event()
         self._last_health_check = 0
         self._health_check_interval = 60  # 健康检查间隔（秒）
-        self._connection_retries = 0
-        self._max_retries = 3
+        # 重连令牌桶：最多连续重连 3 次，之后每 10 秒补充一个令牌
+        self._reconnect_capacity = 3
+        self._reconnect_tokens = 3
+        self._reconnect_refill_at = 0.0
+        self._reconnect_refill_period = 10.0
+        # 命令名 -> 当前连接上的绑定方法，连接重建时清空
+        self._ops: Dict[str, Callable] = {}
 
     async def _health_check(self):
         """定期健康检查，避免每次操作都检查"""
@@ -34,7 +54,6 @@ class RedisService:
         try:
             await self.redis.ping()
             self._last_health_check = current_time
-            self._connection_retries = 0  # 重置重试计数
             return True
         except Exception as e:
             logger.warning(f"Redis健康检查失败: {e}")
@@ -54,225 +73,271 @@ class RedisService:
     async def init_redis(self):
         """初始化Redis连接"""
         if self._connecting:
-            # 如果正在连接，等待完成
-            retry_count = 0
-            while self._connecting and retry_count < 50:  # 最多等待5秒
-                await asyncio.sleep(0.1)
-                retry_count += 1
+            # 如果正在连接，等待完成，最多等待5秒
+            try:
+                await asyncio.wait_for(self._connected_event.wait(), timeout=5.0)
+            except asyncio.TimeoutError:
+                logger.warning("等待Redis连接超时")
             return
 
         self._connecting = True
+        self._connected_event.clear()
         try:
             # 如果存在旧连接，先关闭
-            if self.redis:
-                try:
-                    await self.redis.close()
-                except:
-                    pass
+            await self._release()
 
-            self.redis = await aioredis.from_url(
+            # 显式连接池：多个协程可并发使用不同连接，安装 hiredis 时自动使用 C 解析器
+            self._pool = aioredis.ConnectionPool.from_url(
                 settings.redis.url,
-                decode_responses=True,
+                max_connections=50,
+                decode_responses=self._decode_responses,
                 retry_on_timeout=True,
                 socket_connect_timeout=5,
                 socket_timeout=5,
                 health_check_interval=30,
             )
+            self.redis = aioredis.Redis(connection_pool=self._pool)
+            self._ops.clear()
             # 测试连接
             await self.redis.ping()
             self._last_health_check = time.time()
-            self._connection_retries = 0
             logger.info("Redis连接成功")
         except Exception as e:
-            self._connection_retries += 1
-            logger.error(
-                f"Redis连接失败 (尝试 {self._connection_retries}/{self._max_retries}): {e}"
-            )
+            logger.error(f"Redis连接失败: {e}")
             self.redis = None
         finally:
             self._connecting = False
+            self._connected_event.set()
+
+    async def _release(self):
+        """关闭客户端并断开连接池，忽略关闭过程中的错误"""
+        try:
+            if self.redis:
+                await self.redis.aclose()
+            if self._pool:
+                # 传入的连接池不会随客户端关闭，需要单独断开
+                await self._pool.disconnect()
+        except Exception:
+            pass
+        finally:
+            self.redis = None
+            self._pool = None
 
     async def close_redis(self):
         """关闭Redis连接"""
         if self.redis:
             try:
-                await self.redis.close()
+                await self.redis.aclose()
+                await self._pool.disconnect()
                 logger.info("Redis连接已关闭")
             except Exception as e:
                 logger.warning(f"关闭Redis连接时出错: {e}")
             finally:
                 self.redis = None
+                self._pool = None
+                self._ops.clear()
                 self._last_health_check = 0
 
-    async def _execute_with_retry(self, operation, *args, **kwargs):
-        """执行Redis操作，支持异常驱动的重连"""
-        # 首次尝试：使用现有连接
-        if self.redis is None:
-            await self._ensure_connection()
+    def _op(self, name: str) -> Callable:
+        """获取当前连接上的命令方法，按命令名缓存"""
+        op = self._ops.get(name)
+        if op is None:
+            op = self._ops[name] = getattr(self.redis, name)
+        return op
+
+    def _take_reconnect_token(self) -> bool:
+        """按令牌桶限制重连频率，无可用令牌时返回 False"""
+        now = time.monotonic()
+        tokens = min(
+            self._reconnect_capacity,
+            self._reconnect_tokens + int((now - self._reconnect_refill_at) / self._reconnect_refill_period),
+        )
+        if tokens <= 0:
+            return False
+        self._reconnect_tokens = tokens - 1
+        self._reconnect_refill_at = now
+        return True
+
+    async def _fast(self, op_name: str, *args, **kwargs):
+        """执行Redis操作的快速路径：正常情况下只有一次 await，出现网络错误才进入 _slow
 
+        Args:
+            op_name: Redis 命令方法名，例如 "get"；重连后会在新连接上重新获取
+        """
         if self.redis is None:
-            return None
+            await self._ensure_connection()
+            if self.redis is None:
+                return None
 
         try:
-            return await operation(*args, **kwargs)
-        except (
-            aioredis.ConnectionError,
-            aioredis.TimeoutError,
-            ConnectionResetError,
-            BrokenPipeError,
-            asyncio.exceptions.CancelledError,
-        ) as e:
-            # 网络相关错误，尝试重连
-            logger.warning(f"Redis连接错误，尝试重连: {e}")
-
-            if self._connection_retries < self._max_retries:
-                await self._ensure_connection(force_check=True)
-                if self.redis:
-                    try:
-                        return await operation(*args, **kwargs)
-                    except Exception as retry_e:
-                        logger.error(f"Redis重连后操作仍失败: {retry_e}")
-            else:
-                logger.error(f"Redis重连次数已达上限 ({self._max_retries})")
+            return await self._op(op_name)(*args, **kwargs)
+        except _NET_ERRORS as e:
+            return await self._slow(op_name, e, *args, **kwargs)
         except Exception as e:
             # 其他错误，记录但不重连
             logger.warning(f"Redis操作失败: {e}")
+            return None
 
+    async def _slow(self, op_name: str, error: BaseException, *args, **kwargs):
+        """网络错误后的慢路径：按令牌桶限制重连并重放一次命令"""
+        logger.warning(f"Redis连接错误，尝试重连: {error}")
+
+        if self._take_reconnect_token():
+            await self._ensure_connection(force_check=True)
+            if self.redis:
+                try:
+                    return await self._op(op_name)(*args, **kwargs)
+                except Exception as retry_e:
+                    logger.error(f"Redis重连后操作仍失败: {retry_e}")
+        else:
+            logger.error("Redis重连过于频繁，暂不重连")
         return None
 
+    # 兼容旧名称，非热点命令仍通过该入口调用
+    _execute_with_retry = _fast
+
     async def get(self, key: str) -> Optional[str]:
         """获取缓存值"""
-        return await self._execute_with_retry(self.redis.get, key)
+        return await self._fast("get", key)
 
     async def set(self, key: str, value: str, expire: Optional[int] = None, nx: bool = False, xx: bool = False) -> bool:
         """设置缓存值"""
-        result = await self._execute_with_retry(self.redis.set, key, value, ex=expire, nx=nx, xx=xx)
+        result = await self._fast("set", key, value, ex=expire, nx=nx, xx=xx)
         return result is not None and result
 
     async def delete(self, key: str) -> bool:
         """删除缓存值"""
-        result = await self._execute_with_retry(self.redis.delete, key)
+        result = await self._execute_with_retry("delete", key)
         return result is not None and result > 0
 
+    async def unlink(self, *keys: str) -> int:
+        """一条命令删除多个键，内存由Redis后台线程释放；不支持 UNLINK 时退回 DEL"""
+        if not keys:
+            return 0
+        result = await self._execute_with_retry("unlink", *keys)
+        if result is None:
+            result = await self._execute_with_retry("delete", *keys)
+        return result if result is not None else 0
+
     async def exists(self, key: str) -> bool:
         """检查键是否存在"""
-        result = await self._execute_with_retry(self.redis.exists, key)
+        result = await self._fast("exists", key)
         return result is not None and result > 0
 
     async def expire(self, key: str, seconds: int) -> bool:
         """设置键的过期时间"""
-        result = await self._execute_with_retry(self.redis.expire, key, seconds)
+        result = await self._execute_with_retry("expire", key, seconds)
         return result is not None and result
 
     async def keys(self, pattern: str) -> List[str]:
         """获取匹配指定模式的键"""
-        return await self._execute_with_retry(self.redis.keys, pattern)
+        return await self._execute_with_retry("keys", pattern)
 
     async def ttl(self, key: str) -> int:
         """获取键的剩余过期时间"""
-        result = await self._execute_with_retry(self.redis.ttl, key)
+        result = await self._execute_with_retry("ttl", key)
         return result if result is not None else -2
 
     async def rpush(self, key: str, *values: str) -> int:
         """向列表右端推入元素"""
-        result = await self._execute_with_retry(self.redis.rpush, key, *values)
+        result = await self._execute_with_retry("rpush", key, *values)
         return result if result is not None else 0
 
     async def lpop(self, key: str) -> Optional[str]:
         """从列表左端弹出元素"""
-        return await self._execute_with_retry(self.redis.lpop, key)
+        return await self._execute_with_retry("lpop", key)
 
     async def llen(self, key: str) -> int:
         """获取列表长度"""
-        result = await self._execute_with_retry(self.redis.llen, key)
+        result = await self._execute_with_retry("llen", key)
         return result if result is not None else 0
 
     async def lindex(self, key: str, index: int) -> Optional[str]:
         """获取列表指定索引位置的元素"""
-        return await self._execute_with_retry(self.redis.lindex, key, index)
+        return await self._execute_with_retry("lindex", key, index)
 
     async def lset(self, key: str, index: int, value: str) -> bool:
         """设置列表指定索引位置的元素值"""
-        result = await self._execute_with_retry(self.redis.lset, key, index, value)
+        result = await self._execute_with_retry("lset", key, index, value)
         return result is not None and result
 
     async def lpush(self, key: str, *values: str) -> int:
         """向列表左端推入元素"""
-        result = await self._execute_with_retry(self.redis.lpush, key, *values)
+        result = await self._execute_with_retry("lpush", key, *values)
         return result if result is not None else 0
 
     async def rpop(self, key: str) -> Optional[str]:
         """从列表右端弹出元素"""
-        return await self._execute_with_retry(self.redis.rpop, key)
+        return await self._execute_with_retry("rpop", key)
 
     async def lrange(self, key: str, start: int = 0, end: int = -1) -> List[str]:
         """获取列表指定范围的元素"""
-        result = await self._execute_with_retry(self.redis.lrange, key, start, end)
+        result = await self._execute_with_retry("lrange", key, start, end)
         return result if result is not None else []
 
     async def sadd(self, key: str, *values: str) -> int:
         """向集合添加元素"""
-        result = await self._execute_with_retry(self.redis.sadd, key, *values)
+        result = await self._execute_with_retry("sadd", key, *values)
         return result if result is not None else 0
 
     async def srem(self, key: str, *values: str) -> int:
         """从集合中移除元素"""
-        result = await self._execute_with_retry(self.redis.srem, key, *values)
+        result = await self._execute_with_retry("srem", key, *values)
         return result if result is not None else 0
 
     async def smembers(self, key: str) -> set:
         """获取集合所有成员"""
-        result = await self._execute_with_retry(self.redis.smembers, key)
+        result = await self._execute_with_retry("smembers", key)
         return result if result is not None else set()
 
     async def incr(self, key: str, amount: int = 1) -> int:
         """原子性增加键的值"""
-        result = await self._execute_with_retry(self.redis.incr, key, amount)
+        result = await self._fast("incr", key, amount)
         return result if result is not None else 0
 
     async def decr(self, key: str, amount: int = 1) -> int:
         """原子性减少键的值"""
-        result = await self._execute_with_retry(self.redis.decr, key, amount)
+        result = await self._execute_with_retry("decr", key, amount)
         return result if result is not None else 0
 
     async def zcard(self, key: str) -> int:
         """获取有序集合的元素数量"""
-        result = await self._execute_with_retry(self.redis.zcard, key)
+        result = await self._execute_with_retry("zcard", key)
         return result if result is not None else 0
 
     async def zadd(self, key: str, mapping: dict) -> int:
         """向有序集合添加元素"""
-        result = await self._execute_with_retry(self.redis.zadd, key, mapping)
+        result = await self._execute_with_retry("zadd", key, mapping)
         return result if result is not None else 0
 
     async def zrange(self, key: str, start: int = 0, end: int = -1) -> List[str]:
         """获取有序集合指定范围的元素"""
-        result = await self._execute_with_retry(self.redis.zrange, key, start, end)
+        result = await self._execute_with_retry("zrange", key, start, end)
         return result if result is not None else []
 
     async def zrem(self, key: str, *values: str) -> int:
         """从有序集合中删除元素"""
-        result = await self._execute_with_retry(self.redis.zrem, key, *values)
+        result = await self._execute_with_retry("zrem", key, *values)
         return result if result is not None else 0
 
     async def zincrby(self, key: str, increment: int, *values: str) -> str:
         """对有序集合中指定成员的分数加上增量 increment"""
-        result = await self._execute_with_retry(self.redis.zincrby, key, increment, *values)
+        result = await self._execute_with_retry("zincrby", key, increment, *values)
         return result if result is not None else '0'
 
     async def zscore(self, key: str, field: str):
         """获取有序集合中指定成员的分数"""
-        result = await self._execute_with_retry(self.redis.zscore, key, field)
+        result = await self._execute_with_retry("zscore", key, field)
         return result if result is not None else '0'
 
     async def zrangebyscore(self, key: str, start: int = 0, end: int = -1) -> List[str]:
         """获取有序集合指定分数范围内的元素"""
-        result = await self._execute_with_retry(self.redis.zrangebyscore, key, start, end)
+        result = await self._execute_with_retry("zrangebyscore", key, start, end)
         return result if result is not None else []
 
     async def zrank(self, key: str, field: str):
         """获取有序集合中指定成员的排名"""
-        result = await self._execute_with_retry(self.redis.zrank, key, field)
+        result = await self._execute_with_retry("zrank", key, field)
         return result if result is not None else -1
 
     async def zrevrangebyscore(
@@ -287,9 +352,9 @@ class RedisService:
     ) -> List:
         """
         异步获取有序集合指定分数范围内的元素（倒序）
-        参数与 redis-py 保持一致，内部转成 aioredis 关键字
+        参数与 redis-py 保持一致
         """
-        # aioredis 使用 offset + count 而不是 start + num
+        # 统一语义：start + num，未指定时取全部
         offset = start if start is not None else 0
         count = num if num is not None else -1   # -1 表示全部
 
@@ -302,70 +367,118 @@ class RedisService:
             num=count,
             score_cast_func=score_cast_func,
         )
-        # aioredis 2.x 返回空列表时就是 []，无需再处理 None
+        # 无结果时返回 []，无需再处理 None
         return result
 
     async def hget(self, key: str, field: str) -> str:
         """获取哈希表中的字段值"""
-        result = await self._execute_with_retry(self.redis.hget, key, field)
+        result = await self._fast("hget", key, field)
         return result
 
     async def hset(self, key: str, field: str, *values: str) -> str:
         """设置哈希表中的字段值"""
-        result = await self._execute_with_retry(self.redis.hset, key, field, *values)
+        result = await self._execute_with_retry("hset", key, field, *values)
         return result
 
     async def hmset(self, key: str, mapping: dict) -> str:
         """设置多个字段的值"""
-        result = await self._execute_with_retry(self.redis.hset, key, None, None, mapping)
+        result = await self._execute_with_retry("hset", key, None, None, mapping)
         return result
 
     async def hmget(self, key: str, *fields: str) -> List[str]:
         """获取多个字段的值"""
-        result = await self._execute_with_retry(self.redis.hmget, key, *fields)
+        result = await self._execute_with_retry("hmget", key, *fields)
         return result if result is not None else []
 
     async def hgetall(self, key: str) -> Dict[str, str]:
         """获取哈希表所有字段的值"""
-        result = await self._execute_with_retry(self.redis.hgetall, key)
+        result = await self._execute_with_retry("hgetall", key)
         return result if result is not None else {}
 
     async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
         """原子性增加哈希表字段的值"""
-        result = await self._execute_with_retry(self.redis.hincrby, key, field, amount)
+        result = await self._execute_with_retry("hincrby", key, field, amount)
         return result
 
     def pipeline(self):
         """获取Redis管道对象"""
         return self.redis.pipeline()
 
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """一次往返批量获取多个键的值，不存在的键返回 None"""
+        if not keys:
+            return []
+        result = await self._execute_with_retry("mget", keys)
+        return result if result is not None else [None] * len(keys)
+
+    async def pipeline_exec(self, ops: List[Tuple[str, tuple, dict]], transaction: bool = False) -> List[Any]:
+        """在一个管道中批量执行命令，只产生一次网络往返
+
+        Args:
+            ops: (命令名, 位置参数, 关键字参数) 列表，例如 [("hget", (key, field), {})]
+            transaction: 是否以 MULTI/EXEC 事务方式执行
+
+        Returns:
+            与 ops 一一对应的结果列表；Redis 不可用时返回空列表
+        """
+        if not ops:
+            return []
+        if self.redis is None:
+            await self._ensure_connection()
+        if self.redis is None:
+            return []
+
+        async def _run():
+            pipe = self.redis.pipeline(transaction=transaction)
+            for op_name, args, kwargs in ops:
+                getattr(pipe, op_name)(*args, **kwargs)
+            return await pipe.execute()
+
+        try:
+            return await _run()
+        except _NET_ERRORS as e:
+            logger.warning(f"Redis管道连接错误，尝试重连: {e}")
+            if self._take_reconnect_token():
+                await self._ensure_connection(force_check=True)
+                if self.redis:
+                    try:
+                        return await _run()
+                    except Exception as retry_e:
+                        logger.error(f"Redis重连后管道执行仍失败: {retry_e}")
+            else:
+                logger.error("Redis重连过于频繁，暂不重连")
+        except Exception as e:
+            logger.warning(f"Redis管道执行失败: {e}")
+
+        return []
+
     async def brpop(self, key: str, timeout: int = 0):
         """阻塞弹出元素"""
-        return await self._execute_with_retry(self.redis.brpop, key, timeout)
+        return await self._execute_with_retry("brpop", key, timeout)
 
     async def xadd(self, key: str, mapping: dict, id: str = '*', maxlen: int = None, approximate: bool = False):
         """添加元素到列表"""
-        return await self._execute_with_retry(self.redis.xadd, key, mapping, id, maxlen, approximate)
+        return await self._execute_with_retry("xadd", key, mapping, id, maxlen, approximate)
 
     async def xread(self, streams: dict, block: int = 0, count: int = 0):
         """读取列表元素"""
-        return await self._execute_with_retry(self.redis.xread, streams, count, block)
+        return await self._execute_with_retry("xread", streams, count, block)
 
     async def xrange(self, key: str, start: str = '-', end: str = '+', count: int = None):
         """读取列表元素"""
-        return await self._execute_with_retry(self.redis.xrange, key, start, end, count)
+        return await self._execute_with_retry("xrange", key, start, end, count)
 
     async def eval(self, lua: str, numkeys: int, *keys_and_args:EncodableT):
         """执行Lua脚本"""
-        return await self._execute_with_retry(self.redis.eval, lua, numkeys, *keys_and_args)
+        return await self._execute_with_retry("eval", lua, numkeys, *keys_and_args)
 
     async def ping(self):
         """测试Redis服务是否正常"""
-        return await self._execute_with_retry(self.redis.ping)
+        return await self._execute_with_retry("ping")
 
     async def ltrim(self, key: str, start: int, end: int):
         """修剪列表"""
-        return await self._execute_with_retry(self.redis.ltrim, key, start, end)
+        return await self._execute_with_retry("ltrim", key, start, end)
 
     def __getattr__(self, name: str):
         """动态代理未显式暴露的 Redis 命令，自动包装调用以支持重试机制。
@@ -382,7 +495,7 @@ class RedisService:
                 raise AttributeError(name)
             import inspect
             if inspect.iscoroutinefunction(attr):
-                return await self._execute_with_retry(attr, *args, **kwargs)
+                return await self._execute_with_retry(name, *args, **kwargs)
             else:
                 loop = asyncio.get_running_loop()
                 return await loop.run_in_executor(None, lambda: attr(*args, **kwargs))
@@ -393,6 +506,8 @@ class RedisService:
 
 # 全局Redis服务实例
 redis_service = RedisService()
+# 不解码响应的Redis服务实例，值以 bytes 读写
+redis_raw_service = RedisService(decode_responses=False)
 
 
 async def get_redis() -> RedisService:
@@ -402,16 +517,27 @@ async def get_redis() -> RedisService:
 def get_redis_sync() -> RedisService:
     return redis_service
 
+def get_redis_raw_sync() -> RedisService:
+    return redis_raw_service
 
-_lock = asyncio.Lock()
+
+_lock: Optional[asyncio.Lock] = None
 _ref = 0
 
+
+def _get_lock() -> asyncio.Lock:
+    """在运行中的事件循环内惰性创建锁"""
+    global _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    return _lock
+
 @asynccontextmanager
 async def init_redis_client():
     global _ref
     need_init = False
     # 增加引用计数并确定是否需要初始化
-    async with _lock:
+    async with _get_lock():
         _ref += 1
         if redis_service.redis is None:
             need_init = True
@@ -420,13 +546,13 @@ async def init_redis_client():
             await redis_service.init_redis()
         except Exception:
             # 初始化失败，回退引用计数并抛出异常
-            async with _lock:
+            async with _get_lock():
                 _ref -= 1
             raise
     try:
         yield
     finally:
-        async with _lock:
+        async with _get_lock():
             _ref -= 1
             if _ref <= 0 and redis_service.redis is not None:
                 await redis_service.close_redis()
@@ -0,0 +1,27 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _json_default(obj: Any) -> Any:
+    """orjson 无法原生序列化的类型才会进入这里"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    # ORM 对象 / pydantic 模型等交给 jsonable_encoder 兜底；嵌套的 Decimal 同样保留为字符串
+    return jsonable_encoder(obj, custom_encoder={Decimal: str})
+
+
+class ORJSONResponse(JSONResponse):
+    """使用 orjson 序列化的 JSON 响应
+
+    orjson 原生支持 datetime/UUID/numpy，Decimal、ORM 对象等通过 default 回调处理，
+    因此无需对整个响应再做一次 jsonable_encoder 预处理
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS, default=_json_default)
@@ -1,6 +1,10 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Union
-from jose import JWTError, jwt
+import jwt
+from cachetools import LRUCache
+from jwt import InvalidTokenError
 from passlib.context import CryptContext
 from .config import settings
 
@@ -47,15 +51,29 @@ def create_refresh_token(data: dict) -> str:
     return encoded_jwt
 
 
+# 已验签令牌的解码结果：sha256(token) -> payload，命中时仅需检查 exp；不带 exp 的令牌不缓存
+_verified_tokens: LRUCache = LRUCache(maxsize=4096)
+
+
 def verify_token(token: str) -> Optional[dict]:
-    """验证令牌"""
+    """验证令牌，同一令牌在有效期内只做一次签名校验"""
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _verified_tokens.get(key)
+    if payload is not None:
+        if payload["exp"] > time.time():
+            # 返回副本，调用方修改不会污染缓存
+            return dict(payload)
+        _verified_tokens.pop(key, None)
+        return None
     try:
         payload = jwt.decode(
             token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
         )
-        return payload
-    except JWTError:
+    except InvalidTokenError:
         return None
+    if isinstance(payload.get("exp"), (int, float)):
+        _verified_tokens[key] = dict(payload)
+    return payload
 
 
 def decode_access_token(token: str) -> Optional[str]:
@@ -1,30 +1,142 @@
-import hashlib
-import json
 import functools
-from typing import Callable, Optional, List
-from app.core.redis import get_redis_sync
+import inspect
+import time
+import typing
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+import msgpack
+import orjson
+import xxhash
+from cachetools import TTLCache
+from typing import Callable, Iterable, Optional, List
+from app.core.redis import redis_raw_service
+
+_FIELD_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+# 进程内缓存：(cache_key, cache_field) -> (msgpack 字节, Redis key 预计过期的 monotonic 时间)
+# 清除缓存只会清掉当前进程的条目，其他 worker 进程最多在 LOCAL_CACHE_TTL 秒内仍返回旧值
+LOCAL_CACHE_TTL = 5
+_local_cache = TTLCache(maxsize=1024, ttl=LOCAL_CACHE_TTL)
+
+# 参数均为这些类型时，直接用参数的 repr 作为缓存字段，不再序列化+哈希
+_PRIMITIVE_TYPES = (str, int, float, bool, date, datetime, type(None))
+
+
+def _is_primitive_annotation(annotation) -> bool:
+    if annotation in _PRIMITIVE_TYPES:
+        return True
+    if typing.get_origin(annotation) is typing.Union:
+        return all(arg in _PRIMITIVE_TYPES for arg in typing.get_args(annotation))
+    return False
+
+
+def _has_primitive_params(func: Callable) -> bool:
+    """函数除 self 外的参数是否都标注为基础类型（不含 *args/**kwargs）"""
+    params = list(inspect.signature(func).parameters.values())[1:]
+    return all(
+        p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD) and _is_primitive_annotation(p.annotation)
+        for p in params
+    )
+
+
+def _drop_local(cache_keys: Iterable[str]):
+    """清除进程内缓存中属于指定 key 的条目"""
+    cache_keys = set(cache_keys)
+    for local_key in [k for k in _local_cache if k[0] in cache_keys]:
+        _local_cache.pop(local_key, None)
+
+# msgpack 扩展类型编号
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+_EXT_DECIMAL = 3
+_EXT_UUID = 4
+
+
+def _enc_default(obj):
+    """msgpack 无法直接编码的类型：常见类型保留为扩展类型，其余转为字符串"""
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, date):
+        return msgpack.ExtType(_EXT_DATE, obj.isoformat().encode())
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(obj).encode())
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(_EXT_UUID, obj.bytes)
+    return str(obj)
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == _EXT_UUID:
+        return uuid.UUID(bytes=data)
+    return msgpack.ExtType(code, data)
+
+
+def _pack(value) -> bytes:
+    return msgpack.packb(value, default=_enc_default, use_bin_type=True)
+
+
+def _unpack(data: bytes):
+    return msgpack.unpackb(data, raw=False, ext_hook=_ext_hook, strict_map_key=False)
+
+
+class _ClassBoundWrapper:
+    """在类创建时（__set_name__）按所属类生成专用的包装函数，并用它替换自身
+
+    build(trusted) 返回包装函数；trusted 为 True 表示所属类是 BaseServiceCache 的子类，
+    包装函数可以跳过 isinstance 检查并直接读取 user_id/user 属性。
+    """
+    def __init__(self, func: Callable, build: Callable[[bool], Callable]):
+        functools.update_wrapper(self, func)
+        self._build = build
+        self._generic = None
+
+    def __set_name__(self, owner, name):
+        setattr(owner, name, self._build(issubclass(owner, BaseServiceCache)))
+
+    def _generic_wrapper(self) -> Callable:
+        # 未经过类创建流程（例如事后赋值到类上、外层还有其他装饰器）时使用通用包装
+        if self._generic is None:
+            self._generic = self._build(False)
+        return self._generic
+
+    def __get__(self, instance, owner=None):
+        return self._generic_wrapper().__get__(instance, owner)
+
+    def __call__(self, *args, **kwargs):
+        # 被外层装饰器直接调用时与原函数一样：self 作为第一个参数传入
+        return self._generic_wrapper()(*args, **kwargs)
 
 
 class BaseServiceCache:
     """基础缓存服务类，使用Redis Hash结构实现基于标签的缓存管理"""
 
+    # 缓存按用户隔离时由子类实例设置；类级默认值保证可直接按属性读取
+    user_id: Optional[int] = None
+    user = None
+
     def __init__(self, *args, **kwargs):
-        self.redis = get_redis_sync()
-        self.cache_prefix = "service:cache"
+        # 缓存值为 msgpack 二进制，使用不解码响应的客户端
+        self.redis = redis_raw_service
+        # 缓存字段或值的编码方式变化时递增版本号，旧版本的缓存自然过期
+        self.cache_prefix = "service:cache:v3"
         self.default_expire = 3600  # 默认过期时间2小时
         self.trigger_extend_ttl_ratio = 0.2 # 触发延长过期时间比例
         super().__init__(*args, **kwargs)
 
     def _generate_cache_field(self, func_name: str, args: tuple, kwargs: dict) -> str:
         """生成缓存字段名：函数名和参数的哈希值"""
-        # 序列化参数，排除self参数
-        filtered_args = args
-        params_key = hashlib.md5(
-            json.dumps({
-                'args': filtered_args,
-                'kwargs': kwargs
-            }, sort_keys=True, default=str).encode('utf-8')
-        ).hexdigest()
+        # 序列化参数（已排除self参数），排序键保证相同参数得到相同摘要
+        params_key = xxhash.xxh3_64_hexdigest(
+            orjson.dumps((args, kwargs), option=_FIELD_OPTIONS, default=str)
+        )
 
         return f"{func_name}:{params_key}"
 
@@ -34,8 +146,10 @@ class BaseServiceCache:
             return f"{self.cache_prefix}:{tag}:{user_id}"
         return f"{self.cache_prefix}:{tag}"
 
-    async def _expire_ttl(self, cache_key: str, cache_expire: int):
-        ttl = await self.redis.ttl(cache_key)
+    async def _expire_ttl(self, cache_key: str, cache_expire: int, ttl: Optional[int] = None):
+        """剩余过期时间低于阈值时延长过期时间；已知 ttl 时不再单独查询"""
+        if ttl is None:
+            ttl = await self.redis.ttl(cache_key)
         if ttl <= int(cache_expire * self.trigger_extend_ttl_ratio):
             # 如果缓存已过期，则更新过期时间
             await self.redis.expire(cache_key, cache_expire)
@@ -51,55 +165,99 @@ class BaseServiceCache:
         """
 
         def decorator(func: Callable) -> Callable:
-            @functools.wraps(func)
-            async def wrapper(self, *args, **kwargs):
-                # 确保self是BaseCacheService的子类实例
-                if not isinstance(self, BaseServiceCache):
-                    return await func(self, *args, **kwargs)
-
-                # 获取用户ID
-                user_id = getattr(self, 'user_id', None)
-                if user_id is None:
-                    # 如果没有user_id，则尝试从user对象获取
-                    user = getattr(self, 'user', None)
-                    if user is not None:
-                        user_id = getattr(user, 'id', None)
-
-                # 确定缓存标签
-                cache_tag = tag if tag is not None else func.__name__
-
-                # 生成缓存key和字段
-                cache_key = self._generate_cache_key(user_id, cache_tag)
-                cache_field = self._generate_cache_field(func.__name__, args, kwargs)
-
-                # 设置缓存参数
-                cache_expire = expire if expire is not None else self.default_expire
+            # 装饰时确定字段生成方式：参数均为基础类型时直接使用参数 repr
+            primitive_args = _has_primitive_params(func)
+
+            def build(trusted: bool) -> Callable:
+                @functools.wraps(func)
+                async def wrapper(self, *args, **kwargs):
+                    if trusted:
+                        # 所属类已确定为 BaseServiceCache 子类，user_id/user 有类级默认值
+                        user_id = self.user_id
+                        if user_id is None:
+                            user = self.user
+                            if user is not None:
+                                user_id = getattr(user, 'id', None)
+                    else:
+                        # 确保self是BaseCacheService的子类实例
+                        if not isinstance(self, BaseServiceCache):
+                            return await func(self, *args, **kwargs)
+
+                        # 获取用户ID
+                        user_id = getattr(self, 'user_id', None)
+                        if user_id is None:
+                            # 如果没有user_id，则尝试从user对象获取
+                            user = getattr(self, 'user', None)
+                            if user is not None:
+                                user_id = getattr(user, 'id', None)
+
+                    # 确定缓存标签
+                    cache_tag = tag if tag is not None else func.__name__
+
+                    # 生成缓存key和字段
+                    cache_key = self._generate_cache_key(user_id, cache_tag)
+                    if primitive_args:
+                        cache_field = f"{func.__name__}:{args!r}:{sorted(kwargs.items())!r}"
+                    else:
+                        cache_field = self._generate_cache_field(func.__name__, args, kwargs)
+
+                    # 设置缓存参数
+                    cache_expire = expire if expire is not None else self.default_expire
+
+                    # 先查进程内缓存
+                    local_key = (cache_key, cache_field)
+                    entry = _local_cache.get(local_key)
+                    if entry is not None:
+                        blob, deadline = entry
+                        # 按记录的过期时间估算剩余 ttl，低于阈值时与 Redis 命中一样延长过期时间
+                        remaining = int(deadline - time.monotonic())
+                        if remaining <= int(cache_expire * self.trigger_extend_ttl_ratio):
+                            try:
+                                await self._expire_ttl(cache_key, cache_expire, ttl=remaining)
+                                _local_cache[local_key] = (blob, time.monotonic() + cache_expire)
+                            except Exception:
+                                pass
+                        return _unpack(blob)
+
+                    # 尝试从缓存获取结果
+                    try:
+                        # 字段值与剩余过期时间一次往返取回
+                        replies = await self.redis.pipeline_exec([
+                            ("hget", (cache_key, cache_field), {}),
+                            ("ttl", (cache_key,), {}),
+                        ])
+                        if replies and replies[0] is not None:
+                            ttl = replies[1]
+                            await self._expire_ttl(cache_key, cache_expire, ttl=ttl)
+                            if ttl <= int(cache_expire * self.trigger_extend_ttl_ratio):
+                                ttl = cache_expire
+                            _local_cache[local_key] = (replies[0], time.monotonic() + ttl)
+                            return _unpack(replies[0])
+                    except Exception:
+                        # 缓存读取失败，继续执行函数
+                        pass
 
-                # 尝试从缓存获取结果
-                try:
-                    cached_result = await self.redis.hget(cache_key, cache_field)
-                    if cached_result is not None:
-                        await self._expire_ttl(cache_key, cache_expire)
-                        return json.loads(cached_result)
-                except Exception:
-                    # 缓存读取失败，继续执行函数
-                    pass
+                    # 执行函数获取结果
+                    result = await func(self, *args, **kwargs)
 
-                # 执行函数获取结果
-                result = await func(self, *args, **kwargs)
+                    # 缓存结果
+                    try:
+                        blob = _pack(result)
+                        # 写入字段并设置整个hash的过期时间，一次往返
+                        await self.redis.pipeline_exec([
+                            ("hset", (cache_key, cache_field, blob), {}),
+                            ("expire", (cache_key, cache_expire), {}),
+                        ])
+                        _local_cache[local_key] = (blob, time.monotonic() + cache_expire)
+                    except Exception:
+                        # 缓存存储失败，不影响主流程
+                        pass
 
-                # 缓存结果
-                try:
-                    await self.redis.hset(cache_key, cache_field, json.dumps(result, default=str))
-                    # 设置整个hash的过期时间
-                    await self.redis.expire(cache_key, cache_expire)
-                except Exception:
-                    # 缓存存储失败，不影响主流程
-                    pass
+                    return result
 
-                return result
+                return wrapper
 
-            return wrapper
+            return _ClassBoundWrapper(func, build)
 
         return decorator
 
@@ -139,10 +297,10 @@ class BaseServiceCache:
                 if status is not None:
                     # 函数执行成功清除缓存
                     try:
-                        for tag in tags_to_clear:
-                            cache_key = self._generate_cache_key(user_id, tag)
-                            # 删除整个hash
-                            await self.redis.delete(cache_key)
+                        cache_keys = [self._generate_cache_key(user_id, tag) for tag in tags_to_clear]
+                        _drop_local(cache_keys)
+                        # 所有标签的hash用一条 UNLINK 删除
+                        await self.redis.unlink(*cache_keys)
                     except Exception:
                         # 清除缓存失败不影响主流程
                         pass
@@ -161,10 +319,10 @@ class BaseServiceCache:
             tags: 需要清除的缓存标签列表
         """
         try:
-            for tag in tags:
-                cache_key = self._generate_cache_key(user_id, tag)
-                # 删除整个hash
-                await self.redis.delete(cache_key)
+            cache_keys = [self._generate_cache_key(user_id, tag) for tag in tags]
+            _drop_local(cache_keys)
+            # 所有标签的hash用一条 UNLINK 删除
+            await self.redis.unlink(*cache_keys)
         except Exception:
             # 清除缓存失败不影响主流程
             pass
@@ -207,7 +365,7 @@ class BaseServiceCache:
                 try:
                     cached_result = await self.redis.get(cache_key)
                     if cached_result is not None:
-                        return json.loads(cached_result)
+                        return _unpack(cached_result)
                 except Exception:
                     # 缓存读取失败，继续执行函数
                     pass
@@ -217,7 +375,7 @@ class BaseServiceCache:
 
                 # 缓存结果
                 try:
-                    await self.redis.set(cache_key, json.dumps(result, default=str), expire=cache_expire)
+                    await self.redis.set(cache_key, _pack(result), expire=cache_expire)
                 except Exception:
                     # 缓存存储失败，不影响主流程
                     pass
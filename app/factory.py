@@ -1,9 +1,11 @@
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.core.database import init_databases, close_databases
-from app.core.redis import redis_service
+from app.core.redis import redis_raw_service, redis_service
+from app.core.responses import ORJSONResponse
 from starlette.staticfiles import StaticFiles
 # from app.core.scheduler import get_scheduler
 # from app.jobs import register_all
@@ -13,6 +15,9 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
     print("应用启动中...")
+
+    # 扩大 AnyIO 默认线程池（默认40），供同步端点 / run_in_threadpool 使用
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 200
     
     # 初始化多数据库连接
     await init_databases()
@@ -42,6 +47,7 @@ async def lifespan(app: FastAPI):
     
     # 关闭Redis连接
     await redis_service.close_redis()
+    await redis_raw_service.close_redis()
     print("Redis连接已关闭")
 
 
@@ -52,7 +58,9 @@ def create_app() -> FastAPI:
         description="A FastAPI project using factory pattern with JWT, SQLAlchemy async, and Redis",
         version="1.0.0",
         debug=True,
-        lifespan=lifespan
+        lifespan=lifespan,
+        # 未显式指定 response_class 的端点统一使用 orjson 序列化
+        default_response_class=ORJSONResponse,
     )
     
     # 配置CORS跨域
@@ -74,11 +82,8 @@ def create_app() -> FastAPI:
 
 def setup_routes(app: FastAPI):
     """设置路由"""
-    from app.api import router as api_router
-    
-    # 包含API路由
-    app.include_router(
-        api_router,
-        prefix="/api",
-        tags=["API"]
-    ) 
\ No newline at end of file
+    from app.api import build_router
+    from app.api.routing import flat_include
+
+    # 包含API路由：子路由在此处一次性导入，并直接平铺到 app.router，避免 include_router 逐个重建路由
+    flat_include(app.router, build_router(), prefix="/api", tags=["API"])
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, BigInteger, String, DateTime, Integer, ForeignKey, Enum, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, BigInteger, String, DateTime, Integer, ForeignKey, Enum, LargeBinary, Index
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from enum import Enum as BaseEnum
 
@@ -15,6 +15,10 @@ class Attachments(Base):
     """附件"""
 
     __tablename__ = "attachments"
+    __table_args__ = (
+        # 与 upload_avatar 的去重查询条件一致
+        Index('ix_attach_dedup', 'uploader_id', 'checksum', 'type', 'mime_type'),
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True, comment='主键ID')
     type = Column(Enum(AttachmentTypeEnum), nullable=False, comment='附件类型')
@@ -27,6 +31,7 @@ class Attachments(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment='创建时间')
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment='更新时间')
     checksum = Column(String(32), comment='校验和', index=True)
-    datas = Column(LargeBinary, comment='数据')
+    # 文件内容只在显式访问时加载，元数据查询不携带二进制数据
+    datas = deferred(Column(LargeBinary, comment='数据'))
 
     # avatar_user = relationship("User", back_populates="avatar", foreign_keys="[User.avatar_id]")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Enum as SQLEnum, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Enum as SQLEnum, ForeignKey, Index
 from sqlalchemy.sql import func
 from enum import Enum
 
@@ -36,4 +36,9 @@ class TenantAuthToken(Base):
     refresh_jti = Column(String(40), nullable=False, index=True, comment="刷新令牌")
     expire_time = Column(DateTime(timezone=True), nullable=False, comment="过期时间")
 
+    __table_args__ = (
+        # 对应当日 refresh token 查询：tenant_id + appid 等值过滤，按 expire_time 倒序取第一条
+        Index('ix_tenant_auth_token_lookup', tenant_id, appid, expire_time.desc()),
+    )
+
 
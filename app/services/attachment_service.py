@@ -1,32 +1,38 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 import os
-import hashlib
+import uuid
 import aiofiles
+import aiofiles.os
+from aiofiles.os import path as aiopath
+import xxhash
 from pathlib import Path
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy import and_
 from fastapi import UploadFile
 from typing import Optional
 from typing import Tuple
-import asyncio
 
 from app.models.attachment import Attachments, AttachmentTypeEnum
 from app.models.user import User
 from app.core.config import settings
+from app.core.custom_auth import invalidate_user_cache
+
+
+# 上传文件分块读取大小
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
 
 class AttachmentService:
     """附件服务"""
 
+    # 本进程内已确认存在的上传目录
+    _ready_dirs = set()
+
     def __init__(self, db: AsyncSession, user: User):
         self.db = db
         self.user = user
         self.user_id = user.id
 
-    def _compute_checksum(self, file: bytes) -> str:
-        # 生成文件checksum
-        return hashlib.md5(file).hexdigest()
-
     @property
     def avatar_upload_dir(self):
         """获取头像上传路径"""
@@ -45,39 +51,52 @@ class AttachmentService:
 
     async def upload_avatar(self, file: UploadFile, filename: str) -> Tuple[Optional[int], str]:
         """上传用户头像"""
-        bin_data = await file.read()
-        file_size = len(bin_data)
         mime_type = file.content_type
         max_size = 5 * 1024 * 1024  # 5MB
-        if file_size > max_size:
-            return None, f"文件大小不能超过5MB，当前大小: {file_size / (1024 * 1024):.2f}MB"
-        # 确保头像存储目录存在
-        os.makedirs(self.avatar_upload_dir, exist_ok=True)
+        # 确保头像存储目录存在（每个进程只创建一次）
+        upload_dir = self.avatar_upload_dir
+        if upload_dir not in self._ready_dirs:
+            os.makedirs(upload_dir, exist_ok=True)
+            self._ready_dirs.add(upload_dir)
 
-        checksum = self._compute_checksum(bin_data)
-        # 查询重复上传文件
-        attachment_query = select(Attachments).where(
-            and_(
-                Attachments.checksum == checksum,
-                Attachments.type == AttachmentTypeEnum.URL,
-                Attachments.uploader_id == self.user_id,
-                Attachments.mime_type == mime_type,
-            )
-        )
-        attachment_result = await self.db.execute(attachment_query)
-        attachment = attachment_result.scalars().first()
-        file_extension = filename.split(".")[-1] if "." in filename else "jpg"
-        new_filename = f"{checksum}.{file_extension}"
-        file_path = os.path.join(self.avatar_upload_dir, new_filename)
-        # 检查文件是否已存在
-        file_exists = await asyncio.get_event_loop().run_in_executor(
-            None, os.path.exists, file_path
-        )
+        # 分块读取，同时计算checksum并写入临时文件，内存占用不随文件大小增长
+        tmp_path = os.path.join(upload_dir, f".{uuid.uuid4().hex}.uploading")
+        hasher = xxhash.xxh3_64()
+        file_size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    if file_size > max_size:
+                        break
+                    hasher.update(chunk)
+                    await f.write(chunk)
+            if file_size > max_size:
+                total_size = file.size or file_size
+                return None, f"文件大小不能超过5MB，当前大小: {total_size / (1024 * 1024):.2f}MB"
 
-        if not file_exists:
-            # 异步保存文件
-            async with aiofiles.open(file_path, "wb") as f:
-                await f.write(bin_data)
+            # 生成文件checksum（非加密用途，XXH3-64 的 16 位十六进制串可放入原 checksum 字段）
+            checksum = hasher.hexdigest()
+            # 查询重复上传文件
+            attachment_query = select(Attachments).where(
+                and_(
+                    Attachments.checksum == checksum,
+                    Attachments.type == AttachmentTypeEnum.URL,
+                    Attachments.uploader_id == self.user_id,
+                    Attachments.mime_type == mime_type,
+                )
+            )
+            attachment_result = await self.db.execute(attachment_query)
+            attachment = attachment_result.scalars().first()
+            file_extension = filename.split(".")[-1] if "." in filename else "jpg"
+            new_filename = f"{checksum}.{file_extension}"
+            file_path = os.path.join(upload_dir, new_filename)
+            # 文件不存在时将临时文件移动到最终位置，已存在则直接复用
+            if not await aiopath.exists(file_path):
+                await aiofiles.os.replace(tmp_path, file_path)
+        finally:
+            if await aiopath.exists(tmp_path):
+                await aiofiles.os.remove(tmp_path)
 
         if not attachment:
             attachment = Attachments(
@@ -91,9 +110,16 @@ class AttachmentService:
                 checksum=checksum,
             )
             self.db.add(attachment)
-            await self.db.commit()
-            await self.db.refresh(attachment)
-        user = await self.db.get(User, self.user_id)
-        user.avatar_id = attachment.id
+            # flush 即可拿到自增ID，附件与用户头像在同一事务中提交
+            await self.db.flush()
+        if self.user in self.db:
+            self.user.avatar_id = attachment.id
+        else:
+            # 用户对象来自缓存或其他会话，直接 UPDATE，省去重新查询用户
+            await self.db.execute(
+                update(User).where(User.id == self.user_id).values(avatar_id=attachment.id)
+            )
+            self.user.avatar_id = attachment.id
         await self.db.commit()
+        await invalidate_user_cache(self.user_id)
         return attachment.id, self.get_avatar_access_url(attachment.stored_filename)
@@ -1,61 +1,122 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import bisect
 import datetime
-import pandas as pd
-import numpy as np
-from dateutil.relativedelta import relativedelta
-from typing import List
+import time
+from typing import List, Optional, Tuple
 
-from app.core.redis import get_redis_sync
+from app.core.redis import redis_service
+
+TRADE_DATE_KEY = 'stock:market:trade:date'
+# 进程内交易日缓存的刷新间隔（秒），交易日历每天至多变化一次
+TRADE_DATES_TTL = 600
+
+# 在服务端一次完成：定位不晚于 ARGV[1] 的最近交易日 -> 取其排名 -> 按相对偏移 [ARGV[3], ARGV[4]] 取区间
+# 最近交易日只在 [ARGV[2], ARGV[1]] 窗口内查找，ARGV[2] 为基准日往前 31 天，相邻交易日间隔远小于该窗口
+_TRADE_DATE_RANGE_LUA = """
+local d = redis.call('ZREVRANGEBYSCORE', KEYS[1], ARGV[1], ARGV[2], 'LIMIT', 0, 1)
+if not d[1] then return {} end
+local idx = redis.call('ZRANK', KEYS[1], d[1])
+if not idx then return {} end
+local s = idx + tonumber(ARGV[3])
+local e = idx + tonumber(ARGV[4])
+if s < 0 then s = 0 end
+if e < s then return {} end
+return redis.call('ZRANGE', KEYS[1], s, e)
+"""
+
+
+def _parse_yyyymmdd(s: str) -> datetime.date:
+    """解析 YYYYMMDD 格式日期"""
+    return datetime.date(int(s[0:4]), int(s[4:6]), int(s[6:8]))
 
 
 class MarketBaseService:
 
+    # 进程内交易日缓存：(加载时间, 升序整数日期列表, 对应的成员字符串)，所有实例共享
+    _trade_dates_cache: Optional[Tuple[float, List[int], List[str]]] = None
+    _trade_dates_lock: Optional[asyncio.Lock] = None
+
     def __init__(self, db: AsyncSession, *args, **kwargs):
         self.db = db
-        self.redis = get_redis_sync()
+        self.redis = redis_service
         super().__init__(*args, **kwargs)
 
     async def get_expire_time(self, date: str, days: int):
         """获取过期时间"""
         expired_date = await self.get_stock_trade_date(date, days)
-        date = datetime.datetime.strptime(date.replace('-', ''), '%Y%m%d')
-        if expired_date:
-            expired_date = datetime.datetime.strptime('{}235959'.format(expired_date.replace('-', '')), '%Y%m%d%H%M%S')
-        else:
+        if not expired_date:
             return days * 24 * 60 * 60
-        return int((expired_date - date).total_seconds())
+        start = _parse_yyyymmdd(date.replace('-', ''))
+        end = _parse_yyyymmdd(expired_date.replace('-', ''))
+        # 从起始日零点到到期交易日 23:59:59
+        return (end.toordinal() - start.toordinal()) * 86400 + 86399
+
+    async def _ensure_dates(self) -> Optional[Tuple[float, List[int], List[str]]]:
+        """确保进程内交易日缓存可用，过期后从Redis整体重新加载；加载失败时沿用旧缓存"""
+        cls = MarketBaseService
+        cache = cls._trade_dates_cache
+        if cache is not None and time.monotonic() - cache[0] < TRADE_DATES_TTL:
+            return cache
+        if cls._trade_dates_lock is None:
+            cls._trade_dates_lock = asyncio.Lock()
+        async with cls._trade_dates_lock:
+            cache = cls._trade_dates_cache
+            if cache is not None and time.monotonic() - cache[0] < TRADE_DATES_TTL:
+                return cache
+            members = await self.redis.zrange(TRADE_DATE_KEY, 0, -1)
+            if members:
+                dates = [int(m) for m in members]
+                cache = cls._trade_dates_cache = (time.monotonic(), dates, list(members))
+        return cache
+
+    async def _trade_date_range(self, trade_date_str: str, start_offset: int, end_offset: int) -> List[str]:
+        """以最近交易日为基准，按相对偏移取交易日区间；优先使用进程内缓存"""
+        target = int(trade_date_str)
+        cache = await self._ensure_dates()
+        if cache is not None and target <= cache[1][-1]:
+            _, dates, members = cache
+            idx = bisect.bisect_right(dates, target) - 1
+            if idx < 0:
+                return []
+            start = max(idx + start_offset, 0)
+            end = min(idx + end_offset, len(members) - 1)
+            if end < start:
+                return []
+            return members[start:end + 1]
+
+        # 缓存不可用或日期超出缓存范围时回退到Redis，一次往返完成
+        # 下界用真实日期往前推 31 天，避免 YYYYMMDD 整数相减跨月/跨年出错
+        lower = (_parse_yyyymmdd(trade_date_str) - datetime.timedelta(days=31)).strftime('%Y%m%d')
+        result = await self.redis.eval(
+            _TRADE_DATE_RANGE_LUA, 1, TRADE_DATE_KEY, target, int(lower), start_offset, end_offset
+        )
+        return result or []
 
     async def get_stock_trade_date(self, trade_date: str, range_days: int = None):
         """获取股票交易日，今天不是则获取上一个"""
         if isinstance(trade_date, str):
-            trade_date = datetime.datetime.strptime(trade_date.replace('-', ''), '%Y%m%d')
-        trade_date_str = trade_date.strftime('%Y%m%d')
-        result = await self.redis.zrevrangebyscore('stock:market:trade:date', '-inf', int(trade_date_str), 0, 1)
-        if not result or not result[0]:
-            return None
-        trade_date_str = result[0]
-        if range_days is None:
-            return trade_date_str
-        trade_date_index = await self.redis.zrank('stock:market:trade:date', trade_date_str)
-        if trade_date_index is None or trade_date_index < 0:
-            return None
-        target_index = trade_date_index + range_days
-        trade_days = await self.redis.zrange('stock:market:trade:date', target_index, target_index)
+            trade_date_str = trade_date.replace('-', '')
+        else:
+            trade_date_str = trade_date.strftime('%Y%m%d')
+        # 不传 range_days 时返回基准交易日本身
+        offset = range_days or 0
+        trade_days = await self._trade_date_range(trade_date_str, offset, offset)
         if trade_days and trade_days[0]:
             return trade_days[0]
         return None
 
     async def get_query_trade_date(self, trade_date: str=None, last=0):
         """获取查询日期交易日和实际间隔天数，不传日期为今天往前最近交易日，传日期为日期的上一个交易日"""
-        today = datetime.datetime.now()
+        today = datetime.date.today()
         if trade_date:
             trade_date = trade_date.replace('-', '')
             pre_trade_date = await self.get_stock_trade_date(trade_date, -1)
             if pre_trade_date:
-                last = (today - datetime.datetime.strptime(pre_trade_date, '%Y%m%d')).days + last
+                last = (today - _parse_yyyymmdd(pre_trade_date)).days + last
                 trade_date = pre_trade_date
             else:
-                trade_date = datetime.datetime.strptime(trade_date, '%Y%m%d') - datetime.timedelta(days=1)
+                trade_date = _parse_yyyymmdd(trade_date) - datetime.timedelta(days=1)
                 last = (today - trade_date).days + last
                 trade_date = trade_date.strftime('%Y%m%d')
         else:
@@ -69,18 +130,7 @@ class MarketBaseService:
             trade_date_str = trade_date.replace('-', '')
         else:
             trade_date_str = trade_date.strftime('%Y%m%d')
-        result = await self.redis.zrevrangebyscore('stock:market:trade:date', '-inf', int(trade_date_str), 0, 1)
-        if not result or not result[0]:
-            return []
-        trade_date_str = result[0]
-        trade_date_index = await self.redis.zrank('stock:market:trade:date', trade_date_str)
-        if trade_date_index is None or trade_date_index < 0:
-            return []
-        target_index = trade_date_index - 1 - count
-        trade_days = await self.redis.zrange('stock:market:trade:date', target_index, trade_date_index-1)
-        if not trade_days:
-            return []
-        return trade_days
+        return await self._trade_date_range(trade_date_str, -1 - count, -1)
 
     async def get_next_trade_days(self, trade_date: str = None, count: int = 1) -> List[str]:
         """
@@ -98,26 +148,8 @@ class MarketBaseService:
         else:
             trade_date_str = datetime.datetime.now().strftime('%Y%m%d')
 
-        # 获取基准交易日
-        result = await self.redis.zrevrangebyscore('stock:market:trade:date', '-inf', int(trade_date_str), 0, 1)
-        if not result or not result[0]:
-            return []
-
-        trade_date_str = result[0]
-
-        # 获取基准交易日在列表中的索引
-        trade_date_index = await self.redis.zrank('stock:market:trade:date', trade_date_str)
-        if trade_date_index is None:
-            return []
-
-        # 计算目标索引范围（基准日期之后的count个交易日）
-        target_start_index = trade_date_index + 1
-        target_end_index = trade_date_index + count
-
-        # 获取后续的交易日
-        trade_days = await self.redis.zrange('stock:market:trade:date', target_start_index, target_end_index)
-
-        return trade_days if trade_days else []
+        # 基准交易日之后的count个交易日
+        return await self._trade_date_range(trade_date_str, 1, count)
 
     async def get_trade_dates_between(self, start_date: str, end_date: str) -> List[str]:
         """
@@ -136,9 +168,16 @@ class MarketBaseService:
         if '-' in end_date:
             end_date = end_date.replace('-', '')
 
+        cache = await self._ensure_dates()
+        if cache is not None and int(end_date) <= cache[1][-1]:
+            _, dates, members = cache
+            lo = bisect.bisect_left(dates, int(start_date))
+            hi = bisect.bisect_right(dates, int(end_date))
+            return members[lo:hi]
+
         # 从Redis中获取区间内的交易日
         trade_dates = await self.redis.zrangebyscore(
-            'stock:market:trade:date',
+            TRADE_DATE_KEY,
             int(start_date),
             int(end_date)
         )
@@ -147,6 +186,7 @@ class MarketBaseService:
 
     def check_day_k_query_date_limit(self, trade_date: str):
         """检查日K数据查询日期限制"""
+        from dateutil.relativedelta import relativedelta
         date_limit_year = 3
         today = datetime.date.today()
         limit_date = today - relativedelta(years=date_limit_year)
@@ -154,6 +194,7 @@ class MarketBaseService:
 
     async def check_minute_k_query_date_limit(self, trade_date: str):
         """检查分时数据查询日期限制"""
+        from dateutil.relativedelta import relativedelta
         date_limit_day = 7
         today = datetime.date.today()
         today_str = await self.get_stock_trade_date(today.strftime('%Y%m%d'))
@@ -164,26 +205,60 @@ class MarketBaseService:
         limit_date = today - relativedelta(days=date_limit_day + 2)
         return limit_date.strftime('%Y-%m-%d') <= trade_date
 
+    @staticmethod
+    def _to_list(values, as_int: bool = False) -> list:
+        """数组转为 Python 列表，NaN/Inf 转为 None"""
+        import numpy as np
+        finite = np.isfinite(values)
+        if as_int and finite.all():
+            return values.astype(np.int64).tolist()
+        return np.where(finite, values, None).tolist()
+
     def caculate_vwap_line(self, data: list, vol_key: str = 'vol',  amount_key: str = 'amount', vol_ratio: float = 1, amount_ratio: float = 1):
         """计算股票均价线"""
         if not data:
             return []
-        df = pd.DataFrame(data)
-        # 累计量、累计额
-        df[f'{vol_key}_cum'] = df[vol_key].cumsum()
-        df[f'{amount_key}_cum'] = df[amount_key].cumsum()
+        # numpy 仅在计算指标时才需要，延迟导入以缩短 worker 启动时间
+        import numpy as np
+        raw_vols = [d[vol_key] for d in data]
+        raw_amounts = [d[amount_key] for d in data]
+        vols = np.array(raw_vols, dtype=np.float64)
+        amounts = np.array(raw_amounts, dtype=np.float64)
+        # 累计量、累计额（与 pandas cumsum 一致：缺失值位置保持缺失，其余继续累计）
+        vol_cum = np.nancumsum(vols)
+        vol_cum[np.isnan(vols)] = np.nan
+        amount_cum = np.nancumsum(amounts)
+        amount_cum[np.isnan(amounts)] = np.nan
 
         # 均价线（VWAP）
-        df['vwap_line'] = ((df[f'{amount_key}_cum'] * amount_ratio) / (df[f'{vol_key}_cum'] * vol_ratio)).round(2)
-        df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
-        return df.to_dict(orient='records')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = np.round((amount_cum * amount_ratio) / (vol_cum * vol_ratio), 2)
+
+        vol_cum_list = self._to_list(vol_cum, all(type(v) is int for v in raw_vols))
+        amount_cum_list = self._to_list(amount_cum, all(type(v) is int for v in raw_amounts))
+        vwap_list = self._to_list(vwap)
+        vol_cum_name, amount_cum_name = f'{vol_key}_cum', f'{amount_key}_cum'
+        return [
+            {**d, vol_cum_name: vc, amount_cum_name: ac, 'vwap_line': vw}
+            for d, vc, ac, vw in zip(data, vol_cum_list, amount_cum_list, vwap_list)
+        ]
 
     def caculate_ma_multi(self, data: list, close_key: str = 'close'):
         """计算股票均线"""
-        df = pd.DataFrame(data)
+        if not data:
+            return []
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+        closes = np.array([d[close_key] for d in data], dtype=np.float64)
+        n = len(closes)
+        mas = {}
         # 计算均线，要求“满窗口”才出值
-        df['ma5'] = df[close_key].rolling(window=5, min_periods=5).mean().round(2)
-        df['ma10'] = df[close_key].rolling(window=10, min_periods=10).mean().round(2)
-        df['ma20'] = df[close_key].rolling(window=20, min_periods=20).mean().round(2)
-        df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
-        return df.to_dict(orient='records')
\ No newline at end of file
+        for window in (5, 10, 20):
+            ma = np.full(n, np.nan)
+            if n >= window:
+                ma[window - 1:] = sliding_window_view(closes, window).mean(axis=1)
+            mas[f'ma{window}'] = self._to_list(np.round(ma, 2))
+        return [
+            {**d, 'ma5': m5, 'ma10': m10, 'ma20': m20}
+            for d, m5, m10, m20 in zip(data, mas['ma5'], mas['ma10'], mas['ma20'])
+        ]
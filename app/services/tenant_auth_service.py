@@ -1,22 +1,64 @@
-import json
-from typing import Dict, Any
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Tuple
+from cachetools import TTLCache
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
-from datetime import datetime, timedelta
-from jose import jwt
-import uuid
+from datetime import datetime
+import jwt
+import secrets
 import logging
+import time
 
+from app.core import json
 from app.core.redis import get_redis_sync
 from app.core.service_cache import BaseServiceCache
 from app.models import Tenant, TenantAuthToken
 from app.models.tenant import TenantStatusEnum
-from app.api.utils import md5_signature
+from app.utils import verify_tenant_signature
 from app.core.custom_auth import ALGORITHM
 from app.core.config import settings
 
 _logger = logging.getLogger(__name__)
 
+TENANT_CACHE_KEY = "tenant:appid:{appid}"
+TENANT_CACHE_TTL = 60
+# 进程内缓存，TTL 比 redis 短，降低多进程间的不一致窗口
+_local_tenants: TTLCache = TTLCache(maxsize=1024, ttl=10)
+# 热点查询共用的编译缓存，语句结构固定，条目数有限
+_COMPILED_CACHE: dict = {}
+
+
+@dataclass(frozen=True)
+class TenantSnapshot:
+    """租户快照，仅包含认证所需字段，避免构造 ORM 实例"""
+    id: int
+    appid: str
+    app_secret: str
+    status: str
+    is_active: bool
+
+
+async def invalidate_tenant_cache(appid: str) -> None:
+    """租户信息变更后调用，清除进程内与 redis 中的租户快照"""
+    _local_tenants.pop(appid, None)
+    try:
+        await get_redis_sync().delete(TENANT_CACHE_KEY.format(appid=appid))
+    except Exception as e:
+        _logger.error(f"清除租户缓存失败: {appid}, {e}")
+
+
+def _parse_expire(value: str) -> datetime:
+    """解析缓存中的过期时间，兼容旧格式 "%Y-%m-%d %H:%M:%S" 与 ISO 8601；与原 strftime 写法一致，只保留本地时间"""
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+
+def _expire_ts(data: Dict[str, Any], ts_key: str, legacy_key: str) -> int:
+    """读取缓存中的过期时间戳（秒），兼容升级前以时间字符串写入的数据"""
+    ts = data.get(ts_key)
+    if ts is None:
+        return int(_parse_expire(data.get(legacy_key)).timestamp())
+    return int(ts)
+
 
 class TenantAuthService:
     """租户认证服务"""
@@ -25,99 +67,146 @@ class TenantAuthService:
         self.db = db
         self.redis = get_redis_sync()
 
-    async def get_today_refresh_token_data(self, tenant: Tenant) -> Dict[str, Any]:
-        """获取当日已存在的refresh token"""
-        now = datetime.now()
+    @staticmethod
+    def _today_refresh_key(appid: str, now_ts: int) -> str:
+        return f"tenant:refresh:token:{time.strftime('%Y%m%d', time.localtime(now_ts))}:{appid}"
+
+    async def get_today_refresh_token_data(self, tenant: TenantSnapshot,
+                                           ops: Optional[List[Tuple[str, tuple, dict]]] = None,
+                                           now_ts: Optional[int] = None) -> Dict[str, Any]:
+        """获取当日已存在的refresh token
+
+        传入 ops 时，回写 redis 的命令追加到 ops 中，由调用方通过管道统一提交
+        """
+        if now_ts is None:
+            now_ts = int(time.time())
         data = {}
-        key = f"tenant:refresh:token:{now.strftime('%Y%m%d')}:{tenant.appid}"
+        key = self._today_refresh_key(tenant.appid, now_ts)
         refresh_token_record = await self.redis.get(key)
         if refresh_token_record:
             refresh_token_record = json.loads(refresh_token_record)
             refresh_jti = refresh_token_record.get('refresh_jti')
-            refresh_expire = refresh_token_record.get('expire_time')
-            refresh_expire = datetime.strptime(refresh_expire, "%Y-%m-%d %H:%M:%S")
-            refresh_expires_in = int((refresh_expire - now).total_seconds())
+            refresh_expire_ts = _expire_ts(refresh_token_record, 'expire_ts', 'expire_time')
             data.update({
                 'refresh_jti': refresh_jti,
-                'refresh_expire': refresh_expire,
-                'refresh_expires_in': refresh_expires_in,
+                'refresh_expire_ts': refresh_expire_ts,
+                'refresh_expires_in': refresh_expire_ts - now_ts,
             })
         else:
-            token_filter_expire_time = now + timedelta(
-                seconds=(settings.tenant.refresh_token_expire_time - 24 * 60 * 60))
-            token_query = (select(TenantAuthToken).where(and_(TenantAuthToken.tenant_id == tenant.id,
-                                                              TenantAuthToken.appid == tenant.appid,
-                                                              TenantAuthToken.expire_time > token_filter_expire_time))
-                           .order_by(TenantAuthToken.expire_time.desc()))
+            token_filter_expire_time = datetime.fromtimestamp(
+                now_ts + settings.tenant.refresh_token_expire_time - 24 * 60 * 60)
+            token_query = (select(TenantAuthToken.refresh_jti, TenantAuthToken.expire_time)
+                           .where(and_(TenantAuthToken.tenant_id == tenant.id,
+                                       TenantAuthToken.appid == tenant.appid,
+                                       TenantAuthToken.expire_time > token_filter_expire_time))
+                           .order_by(TenantAuthToken.expire_time.desc())
+                           .limit(1)
+                           .execution_options(compiled_cache=_COMPILED_CACHE))
             refresh_token_record = await self.db.execute(token_query)
-            refresh_token_record = refresh_token_record.scalars().first()
+            refresh_token_record = refresh_token_record.one_or_none()
             if refresh_token_record:
                 refresh_jti = refresh_token_record.refresh_jti
-                refresh_expire = refresh_token_record.expire_time
-                refresh_expires_in = int((refresh_expire - now).total_seconds())
-                await self.redis.set(key, json.dumps({'refresh_jti': refresh_jti,
-                                                      'expire_time': refresh_expire.strftime("%Y-%m-%d %H:%M:%S")}),
-                                     expire=24 * 60 * 60)
+                refresh_expire_ts = int(refresh_token_record.expire_time.timestamp())
+                value = json.dumps({'refresh_jti': refresh_jti, 'expire_ts': refresh_expire_ts})
+                if ops is None:
+                    await self.redis.set(key, value, expire=24 * 60 * 60)
+                else:
+                    ops.append(("set", (key, value), {"ex": 24 * 60 * 60}))
                 data.update({
                     'refresh_jti': refresh_jti,
-                    'refresh_expire': refresh_expire,
-                    'refresh_expires_in': refresh_expires_in,
+                    'refresh_expire_ts': refresh_expire_ts,
+                    'refresh_expires_in': refresh_expire_ts - now_ts,
                 })
         return data
 
+    async def get_tenant_snapshot(self, appid: str) -> Optional[TenantSnapshot]:
+        """按 appid 获取启用中的租户快照：进程内缓存 -> redis -> 数据库"""
+        snapshot = _local_tenants.get(appid)
+        if snapshot is not None:
+            return snapshot
+        key = TENANT_CACHE_KEY.format(appid=appid)
+        cached = await self.redis.get(key)
+        if cached:
+            snapshot = TenantSnapshot(**json.loads(cached))
+            _local_tenants[appid] = snapshot
+            return snapshot
+        tenant_query = (select(Tenant.id, Tenant.appid, Tenant.app_secret, Tenant.status, Tenant.is_active)
+                        .where(and_(Tenant.appid == appid, Tenant.is_active == True))
+                        .execution_options(compiled_cache=_COMPILED_CACHE))
+        tenant = (await self.db.execute(tenant_query)).first()
+        if not tenant:
+            return None
+        snapshot = TenantSnapshot(id=tenant.id, appid=tenant.appid, app_secret=tenant.app_secret,
+                                  status=TenantStatusEnum(tenant.status).value, is_active=tenant.is_active)
+        await self.redis.set(key, json.dumps(asdict(snapshot)), expire=TENANT_CACHE_TTL)
+        _local_tenants[appid] = snapshot
+        return snapshot
+
     async def get_tenant_auth_token(self, appid: str, signature: str) -> Dict[str, Any]:
         """获取租户认证token"""
         if not appid or not signature:
             return {'success': False, 'message': 'appid和signature不能为空'}
-        tenant_query = select(Tenant).where(and_(Tenant.appid == appid, Tenant.is_active == True))
-        tenant = await self.db.execute(tenant_query)
-        tenant = tenant.scalars().first()
+        tenant = await self.get_tenant_snapshot(appid)
         if not tenant:
             return {'success': False, 'message': 'appid不存在'}
-        if tenant.status == TenantStatusEnum.stopped:
+        if tenant.status == TenantStatusEnum.stopped.value:
             return {'success': False, 'message': '租户已停用'}
-        if not md5_signature(appid, tenant.app_secret, signature):
+        if not verify_tenant_signature(appid, tenant.app_secret, signature, settings.tenant.signature_method):
             return {'success': False, 'message': '签名错误'}
         # 生成token
-        now = datetime.now()
-        access_expire = (now + timedelta(seconds=settings.tenant.access_token_expire_time))
+        # exp 直接使用 epoch 秒（RFC 7519 NumericDate），仅在写库时转换为 datetime
+        now_ts = int(time.time())
         access_token = jwt.encode({'tenant_id': tenant.id, 'appid': tenant.appid, 'type': 'access',
-                                   'exp': access_expire}, settings.tenant.token_secret, algorithm=ALGORITHM)
+                                   'exp': now_ts + settings.tenant.access_token_expire_time},
+                                  settings.tenant.token_secret, algorithm=ALGORITHM)
+        # 本次请求的 redis 写操作统一通过一次管道提交
+        ops: List[Tuple[str, tuple, dict]] = []
         # 每天减少refresh_token重复生成
-        refresh_token_data = await self.get_today_refresh_token_data(tenant)
+        refresh_token_data = await self.get_today_refresh_token_data(tenant, ops, now_ts)
         if refresh_token_data:
             refresh_jti = refresh_token_data.get('refresh_jti')
-            refresh_expire = refresh_token_data.get('refresh_expire')
-            refresh_expires_in = int((refresh_expire - now).total_seconds())
+            refresh_expire_ts = refresh_token_data.get('refresh_expire_ts')
+            refresh_expires_in = refresh_token_data.get('refresh_expires_in')
         else:
-            refresh_jti = str(uuid.uuid4())
-            refresh_expire = now + timedelta(seconds=settings.tenant.refresh_token_expire_time)
+            refresh_jti = secrets.token_hex(16)
+            refresh_expire_ts = now_ts + settings.tenant.refresh_token_expire_time
             token_record = TenantAuthToken(tenant_id=tenant.id, appid=tenant.appid, refresh_jti=refresh_jti,
-                                           expire_time=refresh_expire)
+                                           expire_time=datetime.fromtimestamp(refresh_expire_ts))
             self.db.add(token_record)
             await self.db.commit()
             refresh_expires_in = settings.tenant.refresh_token_expire_time
+            # 同时写入当日缓存，当天后续请求无需再查库
+            ops.append(("set", (self._today_refresh_key(tenant.appid, now_ts),
+                                json.dumps({'refresh_jti': refresh_jti, 'expire_ts': refresh_expire_ts})),
+                        {"ex": 24 * 60 * 60}))
         # 生成refresh_token
-        refresh_token = jwt.encode({"refresh_jti": refresh_jti, "type": "refresh", "exp": refresh_expire},
+        refresh_token = jwt.encode({"refresh_jti": refresh_jti, "type": "refresh", "exp": refresh_expire_ts},
                                    settings.tenant.token_secret, algorithm=ALGORITHM)
         await self.set_refresh_token_to_redis(refresh_jti, {
             'tenant_id': tenant.id,
             'appid': tenant.appid,
             'refresh_token': refresh_token,
-            'refresh_expire': refresh_expire.strftime("%Y-%m-%d %H:%M:%S"),
-        })
+            'refresh_expire_ts': refresh_expire_ts,
+        }, ops=ops)
+        await self.redis.pipeline_exec(ops)
         return {'success': True, 'message': '成功',
                 'data': {'access_token': access_token,
                          'expires_in': settings.tenant.access_token_expire_time,
                          'refresh_token': refresh_token,
                          'refresh_expires_in': refresh_expires_in, }}
 
-    async def set_refresh_token_to_redis(self, refresh_jti: str, refresh_token_data: Dict[str, Any], expire: int=None):
-        """将refresh_token保存到redis"""
+    async def set_refresh_token_to_redis(self, refresh_jti: str, refresh_token_data: Dict[str, Any], expire: int=None,
+                                         ops: Optional[List[Tuple[str, tuple, dict]]] = None):
+        """将refresh_token保存到redis，传入 ops 时仅追加命令由调用方通过管道提交"""
         try:
             if expire is None:
                 expire = settings.tenant.refresh_token_expire_time
-            await self.redis.set(f"tenant:refresh:token:{refresh_jti}", json.dumps(refresh_token_data), expire=expire)
+            key = f"tenant:refresh:token:{refresh_jti}"
+            value = json.dumps(refresh_token_data)
+            if ops is None:
+                await self.redis.set(key, value, expire=expire)
+            else:
+                ops.append(("set", (key, value), {"ex": expire}))
         except Exception as e:
             _logger.error('将refresh_token保存到redis失败：%s'%str(e), exc_info=True)
         return True
@@ -144,11 +233,12 @@ class TenantAuthService:
             return {'success': False, 'message': '非法的refresh_token'}
         refresh_jti = payload.get('refresh_jti')
         refresh_token_data = await self.get_refresh_token_from_redis(refresh_jti)
-        now = datetime.now()
+        now_ts = int(time.time())
         if not refresh_token_data:
-            query = select(TenantAuthToken).where(and_(TenantAuthToken.refresh_jti == refresh_jti))
-            refresh_token_record = await self.db.execute(query)
-            refresh_token_record = refresh_token_record.scalars().first()
+            query = (select(TenantAuthToken.tenant_id, TenantAuthToken.appid, TenantAuthToken.expire_time)
+                     .where(and_(TenantAuthToken.refresh_jti == refresh_jti))
+                     .execution_options(compiled_cache=_COMPILED_CACHE))
+            refresh_token_record = (await self.db.execute(query)).first()
             if not refresh_token_record:
                 return {'success': False, 'message': 'refresh_token已过期'}
             # 查询到记录则重载到redis
@@ -156,19 +246,18 @@ class TenantAuthService:
                 'tenant_id': refresh_token_record.tenant_id,
                 'appid': refresh_token_record.appid,
                 'refresh_token': refresh_token,
-                'refresh_expire': refresh_token_record.expire_time.strftime("%Y-%m-%d %H:%M:%S"),
+                'refresh_expire_ts': int(refresh_token_record.expire_time.timestamp()),
             }
-            refresh_expires_in = int((refresh_token_record.expire_time - now).total_seconds())
+            refresh_expires_in = refresh_token_data['refresh_expire_ts'] - now_ts
 
             await self.set_refresh_token_to_redis(refresh_jti, refresh_token_data, refresh_expires_in)
         else:
-            refresh_expires_in = int((
-                        datetime.strptime(refresh_token_data.get('refresh_expire'), "%Y-%m-%d %H:%M:%S") - now).total_seconds())
+            refresh_expires_in = _expire_ts(refresh_token_data, 'refresh_expire_ts', 'refresh_expire') - now_ts
         appid = refresh_token_data.get('appid')
         tenant_id = refresh_token_data.get('tenant_id')
-        access_expire = (now + timedelta(seconds=settings.tenant.access_token_expire_time)).strftime("%Y-%m-%d %H:%M:%S")
         access_token = jwt.encode({'tenant_id': tenant_id, 'appid': appid, 'type': 'access',
-                                   'exp': access_expire}, settings.tenant.token_secret, algorithm=ALGORITHM)
+                                   'exp': now_ts + settings.tenant.access_token_expire_time},
+                                  settings.tenant.token_secret, algorithm=ALGORITHM)
         return {'success': True, 'message': '成功',
                 'data': {'access_token': access_token,
                          'expires_in': settings.tenant.access_token_expire_time,
@@ -1,8 +1,9 @@
+import functools
 import hmac
 import random
 import re
+import secrets
 import string
-import uuid
 from os import urandom
 from sqlalchemy import select
 import math
@@ -22,20 +23,58 @@ from collections import namedtuple
 
 
 def get_uuid():
-    uuid_string = str(uuid.uuid1()).replace("-", "")
-    return uuid_string
+    # 直接由 os.urandom 生成 32 位十六进制串，无需格式化后再去掉 "-"
+    return secrets.token_hex(16)
 
 
-def get_hmac(key=None, s=None, method="SHA1"):
-    key = str(uuid.uuid1()).replace("-", "") if key is None else key
+def get_hmac(key=None, s=None, method="sha256"):
+    key = secrets.token_hex(16) if key is None else key
     s = urandom(64) if s is None else s
 
-    return hmac.new(key.encode("utf-8"), s, method).hexdigest()
+    # 传入算法名由 OpenSSL 直接计算 HMAC，避免 Python 层逐块回调
+    return hmac.new(key.encode("utf-8"), s, method.lower()).hexdigest()
+
+
+def md5_signature(appid: str, secret: str) -> str:
+    """租户签名（旧版：md5(appid + app_secret)）"""
+    return hashlib.md5(f"{appid}{secret}".encode("utf-8")).hexdigest()
+
+
+def blake2b_signature(appid: str, secret: str) -> str:
+    """租户签名（BLAKE2b，16 字节摘要）"""
+    return hashlib.blake2b(f"{appid}{secret}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hmac_sha256_signature(appid: str, secret: str) -> str:
+    """租户签名（以 app_secret 为密钥对 appid 做 HMAC-SHA256）"""
+    return hmac.new(secret.encode("utf-8"), appid.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+_TENANT_SIGNATURES = {
+    "md5": md5_signature,
+    "hmac-sha256": hmac_sha256_signature,
+    "blake2b": blake2b_signature,
+}
+
+
+def verify_tenant_signature(appid: str, secret: str, signature: str, method: str = "md5") -> bool:
+    """校验租户签名，摘要比较使用 hmac.compare_digest 保证常数时间
+
+    method 可选 "md5"（旧版，默认）/ "hmac-sha256" / "blake2b"，配置加载时已校验
+    """
+    sign = _TENANT_SIGNATURES.get(method)
+    if sign is None:
+        raise ValueError(f"不支持的租户签名算法: {method}")
+    return hmac.compare_digest(sign(appid, secret), signature or "")
+
+
+_DIGITS = string.digits
+_ALNUM = string.ascii_uppercase + string.digits
 
 
 def generate_license_key(length=12):
     # 生成一个长度为 length 的由大写字母和数字组成的随机字符串
-    key = "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
+    key = "".join(random.choices(_ALNUM, k=length))
     # 将字符串按照每 4 个字符一组用连字符分隔开
     formatted_key = "-".join([key[i: i + 4] for i in range(0, length, 4)])
     return formatted_key
@@ -50,10 +89,23 @@ def has_none(*args, **kwargs):
 
 def generate_salt(length=8):
     # 生成一个长度为 length 的由大写字母和数字组成的随机字符串
-    salt = "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
+    salt = "".join(random.choices(_ALNUM, k=length))
     return salt
 
 
+_PHONE_RE = re.compile(r"^1\d{10}$")
+# 合法的手机号码段
+_VALID_PHONE_PREFIXES = frozenset({
+    "130", "131", "132", "133", "134", "135", "136", "137", "138", "139",
+    "141", "142", "143", "145", "146", "147", "148", "149", "150", "151",
+    "152", "153", "155", "156", "157", "158", "159", "160", "161", "162",
+    "163", "165", "166", "167", "168", "169", "170", "171", "172", "173",
+    "174", "175", "176", "177", "178", "179", "180", "181", "182", "183",
+    "184", "185", "186", "187", "188", "189", "191", "192", "193", "195",
+    "196", "197", "198", "199",
+})
+
+
 def is_valid_phone(phone_number) -> bool:
     """
     判断是否为合法的中国大陆手机号
@@ -63,102 +115,27 @@ def is_valid_phone(phone_number) -> bool:
     # 先将输入的手机号转换成字符串类型，以兼容用户在前端输入时传入数字类型的情况
     if not phone_number:
         return False
-    phone_number = str(phone_number).strip()
-
-    # 首先判断是否为11位数字
-    if not re.match(r"^1\d{10}$", phone_number):
-        return False
+    # 常见情况：已是去除空白的 11 位字符串，无需再转换
+    if not (isinstance(phone_number, str) and len(phone_number) == 11 and phone_number[0] == '1'):
+        phone_number = str(phone_number).strip()
 
-    # 判断前3位号码段是否为合法的手机号码段
-    prefix = phone_number[:3]
-    if prefix not in [
-        "130",
-        "131",
-        "132",
-        "133",
-        "134",
-        "135",
-        "136",
-        "137",
-        "138",
-        "139",
-        "141",
-        "142",
-        "143",
-        "145",
-        "146",
-        "147",
-        "148",
-        "149",
-        "150",
-        "151",
-        "152",
-        "153",
-        "155",
-        "156",
-        "157",
-        "158",
-        "159",
-        "160",
-        "161",
-        "162",
-        "163",
-        "165",
-        "166",
-        "167",
-        "168",
-        "169",
-        "170",
-        "171",
-        "172",
-        "173",
-        "174",
-        "175",
-        "176",
-        "177",
-        "178",
-        "179",
-        "180",
-        "181",
-        "182",
-        "183",
-        "184",
-        "185",
-        "186",
-        "187",
-        "188",
-        "189",
-        "191",
-        "192",
-        "193",
-        "195",
-        "196",
-        "197",
-        "198",
-        "199",
-    ]:
-        return False
-
-    # 如果以上两个校验都通过，则返回True
-    return True
+    # 11位数字且前3位为合法号码段
+    return bool(_PHONE_RE.match(phone_number)) and phone_number[:3] in _VALID_PHONE_PREFIXES
 
 
 # 为了向后兼容，保留原函数名
 is_valid_phone_number = is_valid_phone
 
 
+# 邮箱格式正则表达式
+_EMAIL_RE = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+
+
 def is_valid_email(email: str) -> bool:
     """
     校验邮箱是否合法
     """
-    if not email:
-        return False
-    # 邮箱格式正则表达式
-    pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-    # 使用正则表达式匹配邮箱
-    if not re.match(pattern, email):
-        return False
-    return True
+    return bool(email) and bool(_EMAIL_RE.match(email))
 
 
 
@@ -168,14 +145,20 @@ def generate_random_code(length=6):
         length参数表示验证码的位数，默认为6位
     """
 
-    return ''.join([str(random.choice(range(10))) for i in range(length)])
+    # 验证码用于身份校验，使用 secrets 生成
+    return ''.join(secrets.choice(_DIGITS) for _ in range(length))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(encoding_name: str):
+    """按名称缓存 tiktoken 编码器；延迟导入，避免导入 app.utils 时加载 tiktoken"""
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
 
 
 def num_tokens_from_string(string: str, encoding_name: str = 'cl100k_base') -> int:
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
+    return len(_get_encoding(encoding_name).encode(string))
 
 
 # async def verify_sms_code(phone: str, code: str) -> Dict[str, Any]:
@@ -242,20 +225,18 @@ def generate_invite_code(user_id: int) -> str:
     invite_code = hash_hex[:8].upper()
     return invite_code
 
-_INVERTDICT = {
-    1e-1: 1e+1, 1e-2: 1e+2, 1e-3: 1e+3, 1e-4: 1e+4, 1e-5: 1e+5,
-    1e-6: 1e+6, 1e-7: 1e+7, 1e-8: 1e+8, 1e-9: 1e+9, 1e-10: 1e+10,
-    2e-1: 5e+0, 2e-2: 5e+1, 2e-3: 5e+2, 2e-4: 5e+3, 2e-5: 5e+4,
-    2e-6: 5e+5, 2e-7: 5e+6, 2e-8: 5e+7, 2e-9: 5e+8, 2e-10: 5e+9,
-    5e-1: 2e+0, 5e-2: 2e+1, 5e-3: 2e+2, 5e-4: 2e+3, 5e-5: 2e+4,
-    5e-6: 2e+5, 5e-7: 2e+6, 5e-8: 2e+7, 5e-9: 2e+8, 5e-10: 2e+9,
-}
+# {1,2,5}e-1 ~ {1,2,5}e-15 的精确倒数，由字面量字符串构造，保证与十进制写法一致
+_INVERTDICT = {}
+for _exp in range(1, 16):
+    _INVERTDICT[float(f'1e-{_exp}')] = float(f'1e+{_exp}')
+    _INVERTDICT[float(f'2e-{_exp}')] = float(f'5e+{_exp - 1}')
+    _INVERTDICT[float(f'5e-{_exp}')] = float(f'2e+{_exp - 1}')
+del _exp
 
 def float_invert(value):
     """Inverts a floating point number with increased accuracy.
 
     :param float value: value to invert.
-    :param bool store: whether store the result in memory for future calls.
     :return: rounded float.
     """
     result = _INVERTDICT.get(value)
@@ -279,6 +260,39 @@ def _float_check_precision(precision_digits=None, precision_rounding=None):
         raise AssertionError(msg)
     return precision_rounding
 
+def _round_half_up(normalized_value, epsilon):
+    # 0.5 rounds away from 0
+    return round(normalized_value + math.copysign(epsilon, normalized_value))
+
+def _round_half_even(normalized_value, epsilon):
+    # 0.5 rounds towards closest even number
+    integral = math.floor(normalized_value)
+    remainder = abs(normalized_value - integral)
+    is_half = abs(0.5 - remainder) < epsilon
+    # if is_half & integral is odd, add odd bit to make it even
+    return integral + (integral & 1) if is_half else round(normalized_value)
+
+def _round_half_down(normalized_value, epsilon):
+    # 0.5 rounds towards 0
+    return round(normalized_value - math.copysign(epsilon, normalized_value))
+
+def _round_up(normalized_value, epsilon):
+    # round to number furthest from zero
+    return math.trunc(normalized_value + math.copysign(1 - epsilon, normalized_value))
+
+def _round_down(normalized_value, epsilon):
+    # round to number closest to zero
+    return math.trunc(normalized_value + math.copysign(epsilon, normalized_value))
+
+# rounding_method -> 舍入实现，避免每次调用逐个比较字符串
+_METHODS = {
+    'HALF-UP': _round_half_up,
+    'HALF-EVEN': _round_half_even,
+    'HALF-DOWN': _round_half_down,
+    'UP': _round_up,
+    'DOWN': _round_down,
+}
+
 def float_round(value, precision_digits=None, precision_rounding=None, rounding_method='HALF-UP'):
     """Return ``value`` rounded to ``precision_digits`` decimal digits,
        minimizing IEEE-754 floating point representation errors, and applying
@@ -336,24 +350,11 @@ def float_round(value, precision_digits=None, precision_rounding=None, rounding_
     # more tolerant of inaccuracies accumulated after multiple floating point operations
     epsilon = 2**(epsilon_magnitude - 50)
 
-    match rounding_method:
-        case 'HALF-UP':  # 0.5 rounds away from 0
-            result = round(normalized_value + math.copysign(epsilon, normalized_value))
-        case 'HALF-EVEN':  # 0.5 rounds towards closest even number
-            integral = math.floor(normalized_value)
-            remainder = abs(normalized_value - integral)
-            is_half = abs(0.5 - remainder) < epsilon
-            # if is_half & integral is odd, add odd bit to make it even
-            result = integral + (integral & 1) if is_half else round(normalized_value)
-        case 'HALF-DOWN':  # 0.5 rounds towards 0
-            result = round(normalized_value - math.copysign(epsilon, normalized_value))
-        case 'UP':  # round to number furthest from zero
-            result = math.trunc(normalized_value + math.copysign(1 - epsilon, normalized_value))
-        case 'DOWN':  # round to number closest to zero
-            result = math.trunc(normalized_value + math.copysign(epsilon, normalized_value))
-        case _:
-            msg = f"unknown rounding method: {rounding_method}"
-            raise ValueError(msg)
+    impl = _METHODS.get(rounding_method)
+    if impl is None:
+        msg = f"unknown rounding method: {rounding_method}"
+        raise ValueError(msg)
+    result = impl(normalized_value, epsilon)
 
     return denormalize(result)
 
@@ -0,0 +1,82 @@
+"""float_round 的 Numba 批量版本
+
+首次调用需要 1~2 秒编译，编译结果通过 cache=True 缓存到 __pycache__，之后的进程直接加载。
+单个数值仍使用 app.utils.float_round。
+"""
+import math
+
+import numba
+import numpy as np
+
+from app.utils import _float_check_precision, float_invert
+
+# rounding_method -> 传给 JIT 函数的整数编码
+ROUNDING_METHODS = {
+    'HALF-UP': 0,
+    'HALF-EVEN': 1,
+    'HALF-DOWN': 2,
+    'UP': 3,
+    'DOWN': 4,
+}
+
+
+@numba.njit(cache=True, parallel=True, fastmath=False)
+def _float_round_array(values, rounding_factor, inverted, method_code):
+    out = np.empty_like(values)
+    for i in numba.prange(values.shape[0]):
+        value = values[i]
+        if value == 0.0:
+            out[i] = 0.0
+            continue
+        # NORMALIZE - ROUND - DENORMALIZE，与 float_round 一致
+        if inverted:
+            normalized_value = value * rounding_factor
+        else:
+            normalized_value = value / rounding_factor
+        epsilon = 2.0 ** (math.log2(abs(normalized_value)) - 50)
+
+        if method_code == 0:  # HALF-UP
+            result = np.rint(normalized_value + math.copysign(epsilon, normalized_value))
+        elif method_code == 1:  # HALF-EVEN
+            integral = math.floor(normalized_value)
+            remainder = abs(normalized_value - integral)
+            if abs(0.5 - remainder) < epsilon:
+                # 奇数时加 1 凑成偶数
+                result = integral + (integral - 2.0 * math.floor(integral / 2.0))
+            else:
+                result = np.rint(normalized_value)
+        elif method_code == 2:  # HALF-DOWN
+            result = np.rint(normalized_value - math.copysign(epsilon, normalized_value))
+        elif method_code == 3:  # UP
+            result = math.trunc(normalized_value + math.copysign(1 - epsilon, normalized_value))
+        else:  # DOWN
+            result = math.trunc(normalized_value + math.copysign(epsilon, normalized_value))
+
+        if inverted:
+            out[i] = result / rounding_factor
+        else:
+            out[i] = result * rounding_factor
+    return out
+
+
+def float_round_array(values, precision_digits=None, precision_rounding=None, rounding_method='HALF-UP'):
+    """批量版 float_round，参数含义与 app.utils.float_round 相同
+
+    :param values: 可转换为 float64 一维数组的数值序列
+    :return: 舍入后的 numpy.ndarray
+    """
+    method_code = ROUNDING_METHODS.get(rounding_method)
+    if method_code is None:
+        msg = f"unknown rounding method: {rounding_method}"
+        raise ValueError(msg)
+    rounding_factor = _float_check_precision(precision_digits=precision_digits,
+                                             precision_rounding=precision_rounding)
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if rounding_factor == 0:
+        return np.zeros_like(values)
+
+    # 与 float_round 相同：对小于 1 的精度取倒数以减少舍入误差
+    inverted = rounding_factor < 1
+    if inverted:
+        rounding_factor = float_invert(rounding_factor)
+    return _float_round_array(values, float(rounding_factor), inverted, method_code)
@@ -4,6 +4,8 @@ from app.factory import create_app
 app = create_app()
 
 if __name__ == "__main__":
+    import os
+
     import uvicorn
     from app.core.config import settings
 
@@ -12,6 +14,10 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8080,
         reload=False,
-        workers=1,
+        # 与 uvicorn 命令行一致读取 WEB_CONCURRENCY，未设置时按 CPU 核数启动
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        log_level="info",
+        loop="uvloop",
+        http="httptools",
     )
 
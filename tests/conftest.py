@@ -0,0 +1,65 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def app_instance():
+    """整个测试会话共用的应用实例"""
+    # 延迟导入：仅依赖 celery 的测试无需加载完整的应用配置
+    from main import app
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app_instance):
+    """整个测试会话共用一个 TestClient，lifespan 只执行一次"""
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_instance) as c:
+        yield c
+
+
+@pytest.fixture
+def client_fresh(app_instance):
+    """需要 monkeypatch 应用状态的测试使用：复用同一个 app，但重新进入 lifespan"""
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_instance) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def _memory_broker():
+    """整个测试会话内 Celery 使用内存 broker"""
+    from app.core import celery as celery_module
+
+    with pytest.MonkeyPatch.context() as mp:
+        # 使用内存队列作为 broker，避免外部依赖
+        mp.setattr(celery_module, "_build_broker_url", lambda: "memory://")
+        celery_module._celery_app.cache_clear()
+        yield
+    celery_module._celery_app.cache_clear()
+
+
+@pytest.fixture
+def memory_celery(_memory_broker):
+    """当前缓存的内存 broker Celery 应用：会话内复用，被测试清除缓存后取重建的实例"""
+    from app.core import celery as celery_module
+
+    return celery_module._celery_app()
+
+
+@pytest.fixture
+def celery_eager(memory_celery):
+    """eager 模式下任务同步执行；结束时移除本测试注册的任务"""
+    registered = set(memory_celery.tasks)
+    memory_celery.conf.task_always_eager = True
+    yield memory_celery
+    memory_celery.conf.task_always_eager = False
+    for name in set(memory_celery.tasks) - registered:
+        memory_celery.tasks.pop(name, None)
+
+
+def pytest_configure(config):
+    # 并行运行（需安装 requirements-dev.txt）：pytest -n auto --dist=loadgroup，标记为同一 xdist_group 的测试会分配到同一进程
+    config.addinivalue_line("markers", "slow: 启动真实 worker 等耗时测试，使用 -m \"not slow\" 跳过")
@@ -0,0 +1,18 @@
+import pytest
+from app.core import celery as celery_module
+from celery.contrib.testing.worker import start_worker
+
+
+# 启动真实 worker 线程，耗时较长；快速回归时使用 pytest -m "not slow" 跳过
+@pytest.mark.slow
+@pytest.mark.xdist_group("celery_global")
+def test_celery_task_with_worker_end_to_end(memory_celery):
+    # 使用内存队列作为 broker，模拟真实 worker 的端到端
+    @celery_module.celery_task(queue="default")
+    def sub(a: int, b: int) -> int:
+        return a - b
+
+    # 跳过启动时的 ping 检查；关闭等待沿用默认值，过短会导致 worker 线程来不及退出
+    with start_worker(memory_celery, perform_ping_check=False) as w:
+        res = sub.delay(10, 3)
+        assert res.get(timeout=10) == 7
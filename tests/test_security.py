@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import pytest
+from app.core import security
+
+
+@pytest.fixture(autouse=True)
+def _clear_token_cache():
+    security._verified_tokens.clear()
+    yield
+    security._verified_tokens.clear()
+
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    """统计 jwt.decode 的调用次数"""
+    calls = []
+    decode = security.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt, "decode", counting_decode)
+    return calls
+
+
+def test_verify_token_cached_on_repeat(decode_calls):
+    token = security.create_access_token({"sub": "alice"})
+
+    first = security.verify_token(token)
+    second = security.verify_token(token)
+
+    assert first["sub"] == "alice"
+    assert second == first
+    # 第二次命中缓存，跳过签名校验
+    assert len(decode_calls) == 1
+
+
+def test_verify_token_returns_copy():
+    token = security.create_access_token({"sub": "alice"})
+    security.verify_token(token)["sub"] = "mallory"
+    security.verify_token(token)["sub"] = "mallory"
+
+    assert security.verify_token(token)["sub"] == "alice"
+
+
+def test_verify_token_without_exp_not_cached(decode_calls):
+    token = security.jwt.encode(
+        {"sub": "alice"}, security.settings.jwt_secret_key, algorithm=security.settings.jwt_algorithm
+    )
+
+    assert security.verify_token(token)["sub"] == "alice"
+    assert security.verify_token(token)["sub"] == "alice"
+    assert len(security._verified_tokens) == 0
+    assert len(decode_calls) == 2
+
+
+def test_verify_token_expired_not_served_from_cache(monkeypatch):
+    token = security.create_access_token({"sub": "alice"}, expires_delta=timedelta(seconds=30))
+    payload = security.verify_token(token)
+    assert payload["sub"] == "alice"
+
+    # 令牌过期后即使仍在缓存中也不应通过
+    monkeypatch.setattr(security.time, "time", lambda: payload["exp"] + 1)
+    assert security.verify_token(token) is None
+
+
+def test_verify_token_invalid_not_cached():
+    assert security.verify_token("not-a-jwt") is None
+    assert len(security._verified_tokens) == 0